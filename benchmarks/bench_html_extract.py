@@ -0,0 +1,81 @@
+"""Compare the streaming selector parser with BeautifulSoup on synthetic search-result pages.
+
+    python benchmarks/bench_html_extract.py --repeat 50
+
+Each fixture in benchmarks/fixtures (written by make_fixtures.py) is run
+through the selectors the scraper uses on that kind of page; both parsers
+must agree on the result. The pages are mostly filler around a block of
+results, so the speedups largely measure how much of a page the streaming
+parser can skip; real pages will differ.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from html_extract import SELECTORS, extract_bs4, extract_fast  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# fixture -> (selector, limit) pairs, as called from scrape_codebases_parallel.py
+CASES = {
+    'huggingface': [('huggingface', None)],
+    'zenodo': [('zenodo', None)],
+    'figshare': [('figshare', None)],
+    'openreview': [('openreview', None)],
+    'codeocean': [('codeocean', None)],
+    'mendeley': [('mendeley', None), ('all_links', None)],  # all_links stands in for a DOI landing page
+    'github_repo': [('github_readme', 1), ('github_commit_authors', None)],
+}
+
+# Selectors that find nothing on the page; the scraper never makes these
+# calls, so they are reported apart from the total.
+NO_MATCH_CASES = {
+    'openreview': [('huggingface', None)],
+}
+
+
+def best_time(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_cases(cases, repeat):
+    """Print a row per case and return the summed bs4 and fast times."""
+    total_bs4 = total_fast = 0.0
+    for page, page_cases in cases.items():
+        with open(os.path.join(FIXTURES, page + '.html'), encoding='utf-8') as fixture:
+            html = fixture.read()
+        for name, limit in page_cases:
+            selector = SELECTORS[name]
+            fast = extract_fast(html, selector, limit)
+            slow = extract_bs4(html, selector, limit)
+            assert fast == slow, f"{page}/{name}: parsers disagree"
+            bs4_time = best_time(lambda: extract_bs4(html, selector, limit), repeat)
+            fast_time = best_time(lambda: extract_fast(html, selector, limit), repeat)
+            total_bs4 += bs4_time
+            total_fast += fast_time
+            print(f"{page:<14}{name:<24}{len(html) / 1024:>6.0f}{bs4_time * 1000:>10.2f}"
+                  f"{fast_time * 1000:>10.2f}{bs4_time / fast_time:>9.1f}x{len(fast):>7}")
+    return total_bs4, total_fast
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark HTML result extraction.')
+    parser.add_argument('--repeat', type=int, default=20, help='Runs per case; the best time is reported')
+    args = parser.parse_args()
+
+    print(f"{'page':<14}{'selector':<24}{'KB':>6}{'bs4 ms':>10}{'fast ms':>10}{'speedup':>10}{'found':>7}")
+    total_bs4, total_fast = run_cases(CASES, args.repeat)
+    print(f"{'total':<38}{total_bs4 * 1000:>16.2f}{total_fast * 1000:>10.2f}{total_bs4 / total_fast:>9.1f}x")
+    print('\nNo match on the page (not in the total):')
+    run_cases(NO_MATCH_CASES, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
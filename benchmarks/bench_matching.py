@@ -0,0 +1,81 @@
+"""Compare the old per-call README substring scan with the batched token matcher.
+
+    python benchmarks/bench_matching.py --titles 2000 --docs 500 --pairs 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from matching import TokenMatcher  # noqa: E402
+
+
+def make_corpus(num_titles, num_docs, doc_words, seed):
+    """Random titles and READMEs drawn from a Zipf-ish vocabulary, so common words repeat as in real text."""
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(20000)] + ['a', 'the', 'of', 'for', 'learning', 'neural', 'network', 'model']
+    weights = [1.0 / (rank + 1) for rank in range(len(words))]
+    titles = [' '.join(rng.choices(words, weights, k=rng.randint(5, 14))) for _ in range(num_titles)]
+    docs = [' '.join(rng.choices(words, weights, k=doc_words)) for _ in range(num_docs)]
+    # Make some pairs genuine matches by planting the title in the README.
+    for i in range(0, num_docs, 3):
+        docs[i] += ' ' + titles[i % num_titles]
+    return titles, docs
+
+
+def legacy_ratio(title, readme_text):
+    """The check validate_repository used to run for every candidate."""
+    title_words = title.lower().split()
+    return sum(1 for word in title_words if word in readme_text) / len(title_words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark title-to-README matching.')
+    parser.add_argument('--titles', type=int, default=2000)
+    parser.add_argument('--docs', type=int, default=500)
+    parser.add_argument('--doc_words', type=int, default=1500, help='Words per synthetic README')
+    parser.add_argument('--pairs', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    titles, docs = make_corpus(args.titles, args.docs, args.doc_words, args.seed)
+    rng = np.random.default_rng(args.seed)
+    pairs = np.stack([rng.integers(0, args.titles, args.pairs), rng.integers(0, args.docs, args.pairs)], axis=1)
+    lowered_docs = [doc.lower() for doc in docs]
+
+    start = time.perf_counter()
+    legacy = [legacy_ratio(titles[t], lowered_docs[d]) for t, d in pairs]
+    legacy_time = time.perf_counter() - start
+
+    matcher = TokenMatcher()
+    start = time.perf_counter()
+    title_ids = [matcher.encode(title) for title in titles]
+    doc_ids = [matcher.encode(doc) for doc in docs]
+    encode_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    per_call = [matcher.coverage_one(title_ids[t], doc_ids[d]) for t, d in pairs]
+    per_call_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = matcher.coverage(title_ids, doc_ids, pairs)
+    batched_time = time.perf_counter() - start
+
+    assert np.allclose(per_call, batched)
+    legacy_hits = sum(ratio >= 0.9 for ratio in legacy)
+    batched_hits = int((batched >= 0.9).sum())
+
+    print(f"{len(pairs)} pairs, {args.titles} titles, {args.docs} READMEs of {args.doc_words} words")
+    print(f"{'method':<28}{'seconds':>10}{'pairs/sec':>14}{'hits':>8}")
+    print(f"{'legacy substring loop':<28}{legacy_time:>10.3f}{len(pairs) / legacy_time:>14.0f}{legacy_hits:>8}")
+    print(f"{'token matcher, per call':<28}{per_call_time:>10.3f}{len(pairs) / per_call_time:>14.0f}{batched_hits:>8}")
+    print(f"{'token matcher, batched':<28}{batched_time:>10.3f}{len(pairs) / batched_time:>14.0f}{batched_hits:>8}")
+    print(f"{'(one-off encoding)':<28}{encode_time:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
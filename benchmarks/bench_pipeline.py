@@ -0,0 +1,197 @@
+"""End-to-end throughput of both scripts against local stand-in servers.
+
+    python benchmarks/bench_pipeline.py --entries 100 1000 10000 --latency 0.05 --out benchmarks/results.json
+
+For each size a synthetic .bib file is generated, benchmarks/stand_in.py
+plays every upstream service, and scrape_codebases_parallel.py and
+add_abstract.py run against it in fresh processes with the HTTP cache off.
+Reported per run: entries/sec, p50/p99 per-entry latency, requests per entry
+and peak RSS. With --shards N the scrape runs as N local processes standing
+in for the nodes of an array job, sharing one rate-limit budget file, and is
+followed by the merge step. Each invocation appends one record, tagged with the current
+commit, to the --out JSON file so results can be compared across commits.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE, '..', 'src')
+sys.path.insert(0, SRC)
+from make_bib import make_entries, write_bib  # noqa: E402
+from rate_limit import DEFAULT_LIMITS  # noqa: E402
+from stand_in import StandIn, paper_platform  # noqa: E402
+
+BATCH_RE = re.compile(r'Fetched batch \d+ of \d+: (\d+) DOIs in ([\d.]+)s')
+
+
+def run_script(args, log_path):
+    """Run a script to completion; return (wall seconds, peak RSS in MB, exit status)."""
+    return run_scripts([args], [log_path])
+
+
+def run_scripts(commands, log_paths):
+    """Run scripts side by side, like nodes of an array job; return (wall seconds, largest peak RSS in MB, worst exit status)."""
+    started = time.perf_counter()
+    processes = []
+    for args, log_path in zip(commands, log_paths):
+        with open(log_path, 'w') as log:
+            processes.append(subprocess.Popen([sys.executable, '-u'] + args, stdout=log, stderr=subprocess.STDOUT))
+    rss_mb, worst = 0.0, 0
+    for process in processes:
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        rss_mb = max(rss_mb, usage.ru_maxrss / 1024)
+        worst = process.returncode if worst == 0 else worst
+    return time.perf_counter() - started, rss_mb, worst
+
+
+def summarize(entries, wall, rss_mb, latencies, requests, status):
+    latencies = np.asarray(latencies, dtype=float)
+    return {
+        'entries': entries,
+        'seconds': round(wall, 3),
+        'entries_per_sec': round(entries / wall, 2),
+        'p50_latency': round(float(np.percentile(latencies, 50)), 3) if len(latencies) else None,
+        'p99_latency': round(float(np.percentile(latencies, 99)), 3) if len(latencies) else None,
+        'requests': requests.get('requests', 0),
+        'requests_per_entry': round(requests.get('requests', 0) / max(1, entries), 2),
+        'rate_limited': requests.get('rate_limited', 0),
+        'errors': requests.get('errors', 0),
+        'peak_rss_mb': round(rss_mb, 1),
+        'exit_status': status,
+    }
+
+
+def bench_scraper(stand_in, bib_path, entries, workdir, args):
+    output_dir = os.path.join(workdir, 'scrape')
+    script = os.path.join(SRC, 'scrape_codebases_parallel.py')
+    command = [script, '--bib_file', bib_path, '--output_dir', output_dir,
+               '--num_threads', str(args.num_threads), '--engine', args.engine, '--stand_in_url', stand_in.url,
+               '--cache_mode', 'off', '--rate_limits', args.client_limits, '--max_per_host', str(args.max_per_host),
+               '--github_token', 'stand-in']
+    if args.stream:
+        command.append('--stream')
+    stand_in.reset_counts()
+    if args.shards > 1:
+        # One local process per shard stands in for the nodes of an array job; all share one GitHub budget.
+        command += ['--shard_count', str(args.shards), '--rate_budget_file', os.path.join(workdir, 'rate_budget.json')]
+        wall, rss_mb, status = run_scripts([command + ['--shard_index', str(index)] for index in range(args.shards)],
+                                           [os.path.join(workdir, f'scrape_{index}.log') for index in range(args.shards)])
+        merge_wall, _, merge_status = run_script([script, 'merge', '--output_dir', output_dir], os.path.join(workdir, 'merge.log'))
+        wall += merge_wall
+        status = status or merge_status
+    else:
+        wall, rss_mb, status = run_script(command, os.path.join(workdir, 'scrape.log'))
+    latencies, found, expected = [], 0, 0
+    for journal_path in glob.glob(os.path.join(output_dir, '**', 'journal.jsonl'), recursive=True):
+        with open(journal_path, encoding='utf-8') as journal:
+            for line in journal:
+                record = json.loads(line)
+                if 'seconds' in record:
+                    latencies.append(record['seconds'])
+                found += record['has_code']
+                expected += paper_platform(record['entry'].get('title', ''), args.code_rate) is not None
+    result = summarize(len(entries), wall, rss_mb, latencies, stand_in.snapshot(), status)
+    result.update(found_code=found, expected_code=expected)
+    return result
+
+
+def bench_abstracts(stand_in, bib_path, entries, workdir, args):
+    output_dir = os.path.join(workdir, 'abstracts')
+    os.makedirs(output_dir, exist_ok=True)
+    command = [os.path.join(SRC, 'add_abstract.py'), '--bib_file', bib_path, '--output_dir', output_dir,
+               '--num_workers', str(args.num_workers), '--stand_in_url', stand_in.url, '--cache_mode', 'off',
+               '--rate_limits', args.client_limits, '--max_per_host', str(args.max_per_host)]
+    stand_in.reset_counts()
+    log_path = os.path.join(workdir, 'abstracts.log')
+    wall, rss_mb, status = run_script(command, log_path)
+    # Every DOI in a batch finishes when the batch does.
+    latencies = []
+    with open(log_path) as log:
+        for match in BATCH_RE.finditer(log.read()):
+            latencies += [float(match.group(2))] * int(match.group(1))
+    return summarize(len(entries), wall, rss_mb, latencies, stand_in.snapshot(), status)
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark both scripts against local stand-in servers.')
+    parser.add_argument('--entries', type=int, nargs='+', default=[100, 1000], help='Sizes of the synthetic .bib files (100 to 50000)')
+    parser.add_argument('--scripts', choices=['both', 'scrape', 'abstracts'], default='both')
+    parser.add_argument('--num_threads', type=int, default=8, help='--num_threads for scrape_codebases_parallel.py')
+    parser.add_argument('--engine', choices=['async', 'threads'], default='async')
+    parser.add_argument('--stream', action='store_true', help='Run scrape_codebases_parallel.py with --stream')
+    parser.add_argument('--shards', type=int, default=1, help='Split the scrape over this many local processes and merge their outputs')
+    parser.add_argument('--num_workers', type=int, default=8, help='--num_workers for add_abstract.py')
+    parser.add_argument('--max_per_host', type=int, default=4)
+    parser.add_argument('--client_rate', type=float, default=1000.0,
+                        help="Requests/sec the scripts' own rate limiter allows per source; keep high to let the stand-ins' limits bite")
+    parser.add_argument('--latency', type=float, default=0.05, help='Mean stand-in response time in seconds')
+    parser.add_argument('--error_rate', type=float, default=0.0, help='Share of stand-in responses that are 502s')
+    parser.add_argument('--rate_limit', type=float, default=0.0, help='Stand-in requests/sec per host before 429s/403s; 0 for none')
+    parser.add_argument('--retry_after', type=int, default=1)
+    parser.add_argument('--code_rate', type=float, default=0.4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=os.path.join(HERE, 'results.json'), help='JSON file the results are appended to')
+    parser.add_argument('--keep', action='store_true', help='Keep the working directory with logs and outputs')
+    args = parser.parse_args()
+    burst = max(1, int(args.client_rate * 2))
+    args.client_limits = ','.join(f'{source}={args.client_rate}:{burst}' for source in DEFAULT_LIMITS)
+
+    stand_in = StandIn(latency=args.latency, error_rate=args.error_rate, rate_limit=args.rate_limit,
+                       retry_after=args.retry_after, code_rate=args.code_rate, seed=args.seed)
+    stand_in.start()
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    runs = []
+    try:
+        for size in args.entries:
+            run_dir = os.path.join(workdir, str(size))
+            os.makedirs(run_dir)
+            entries = make_entries(size, args.seed)
+            bib_path = os.path.join(run_dir, 'bench.bib')
+            write_bib(entries, bib_path)
+            run = {'size': size}
+            if args.scripts in ('both', 'scrape'):
+                run['scrape_codebases_parallel'] = bench_scraper(stand_in, bib_path, entries, run_dir, args)
+                print(f"{size:>6} entries  scrape     {json.dumps(run['scrape_codebases_parallel'])}")
+            if args.scripts in ('both', 'abstracts'):
+                run['add_abstract'] = bench_abstracts(stand_in, bib_path, entries, run_dir, args)
+                print(f"{size:>6} entries  abstracts  {json.dumps(run['add_abstract'])}")
+            runs.append(run)
+    finally:
+        stand_in.stop()
+        if args.keep:
+            print(f'Logs and outputs kept in {workdir}')
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    config = {name: value for name, value in vars(args).items() if name not in ('out', 'keep', 'client_limits')}
+    record = {'commit': current_commit(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'config': config, 'runs': runs}
+    history = []
+    if os.path.exists(args.out):
+        with open(args.out, encoding='utf-8') as results_file:
+            history = json.load(results_file)
+    history.append(record)
+    with open(args.out, 'w', encoding='utf-8') as results_file:
+        json.dump(history, results_file, indent=2)
+    print(f'Appended results to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
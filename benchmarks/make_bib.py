@@ -0,0 +1,73 @@
+"""Write a synthetic .bib file for benchmarks.
+
+    python benchmarks/make_bib.py --entries 10000 --out bench.bib
+
+Titles are random but stable for a seed. Some entries carry a DOI Crossref
+knows, some an arXiv DOI only doi.org resolves, some none at all, and a few
+repeat an earlier title in a different spelling, as consolidated
+bibliographies do.
+"""
+import argparse
+import random
+
+from stand_in import doi_for
+
+WORDS = ('learning neural network graph deep reinforcement policy language model vision transformer attention '
+         'robust efficient sparse symbolic reasoning program synthesis planning inference probabilistic causal '
+         'representation contrastive generative adversarial diffusion retrieval knowledge embedding logic '
+         'theorem proving benchmark dataset agents multi task meta few shot zero continual federated').split()
+
+
+def make_title(rng):
+    words = rng.sample(WORDS, rng.randint(4, 8)) + [f'w{rng.randrange(100000)}']
+    rng.shuffle(words)
+    return ' '.join(words).capitalize()
+
+
+def make_entries(num_entries, seed=0, doi_rate=0.6, arxiv_rate=0.15, duplicate_rate=0.02, abstract_rate=0.1):
+    rng = random.Random(seed)
+    entries = []
+    for i in range(num_entries):
+        if entries and rng.random() < duplicate_rate:
+            # The same paper again, with BibTeX capitalization braces and no DOI.
+            original = rng.choice(entries)
+            title = ' '.join('{' + word + '}' if rng.random() < 0.3 else word for word in original['title'].split())
+            entry = dict(original, ID=f'bench{i}', title=title)
+            entry.pop('doi', None)
+            entries.append(entry)
+            continue
+        title = make_title(rng)
+        entry = {
+            'ENTRYTYPE': 'article',
+            'ID': f'bench{i}',
+            'title': title,
+            'author': ' and '.join(f'Author{rng.randrange(5000)}, {rng.choice("ABCDEFGH")}.' for _ in range(rng.randint(1, 5))),
+            'year': str(rng.randint(2016, 2023)),
+            'journal': rng.choice(['Journal of Benchmarks', 'Proceedings of Synthetic Data', 'arXiv preprint']),
+        }
+        draw = rng.random()
+        if draw < doi_rate:
+            entry['doi'] = doi_for(title)
+        elif draw < doi_rate + arxiv_rate:
+            entry['doi'] = f'10.48550/arXiv.{rng.randint(1601, 2312)}.{rng.randrange(100000):05d}'
+        if rng.random() < abstract_rate:
+            entry['abstract'] = f'An existing abstract for {title.lower()}.'
+        entries.append(entry)
+    return entries
+
+
+def write_bib(entries, path):
+    with open(path, 'w', encoding='utf-8') as bib_file:
+        for entry in entries:
+            fields = ',\n'.join(f' {name} = {{{value}}}' for name, value in entry.items() if name not in ('ENTRYTYPE', 'ID'))
+            bib_file.write(f"@{entry['ENTRYTYPE']}{{{entry['ID']},\n{fields}\n}}\n\n")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic BibTeX file.')
+    parser.add_argument('--entries', type=int, default=1000)
+    parser.add_argument('--out', required=True)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    write_bib(make_entries(args.entries, args.seed), args.out)
+    print(f'Wrote {args.entries} entries to {args.out}')
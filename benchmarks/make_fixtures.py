@@ -0,0 +1,135 @@
+"""Write the synthetic search-result pages in benchmarks/fixtures.
+
+    python benchmarks/make_fixtures.py
+
+They are not saved copies of the real sites: each page wraps markup shaped
+like the results the scraper's selectors look for in a head of metadata and
+scripts, a navigation bar, unrelated sidebar blocks and a footer, so that
+most of the page is markup the parser has to get past. The text is random
+but stable for a seed.
+"""
+import argparse
+import os
+import random
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+WORDS = ('learning neural graph network model data robust efficient transformer vision language reinforcement '
+         'policy optimization sparse dense attention retrieval benchmark dataset symbolic reasoning').split()
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def head(rng, title):
+    metas = '\n'.join(f'<meta name="m{i}" content="{sentence(rng, 6)}">' for i in range(20))
+    scripts = '\n'.join(f'<script type="module" src="/assets/chunk-{i:04x}.js" crossorigin="anonymous"></script>' for i in range(15))
+    data = ','.join('{"id": %d, "name": "%s"}' % (i, sentence(rng, 3)) for i in range(80))
+    return (f'<!DOCTYPE html>\n<html lang="en"><head><meta charset="utf-8"><title>{title}</title>\n{metas}\n{scripts}\n'
+            f'<script>window.__DATA__ = {{"items": [{data}]}};</script>\n'
+            '<style>.a{color:red} .b > .c {margin:0}</style></head>\n')
+
+
+def nav():
+    items = ''.join(f'<li class="nav-item"><a class="nav-link" href="/section/{i}">{word}</a></li>' for i, word in enumerate(WORDS))
+    return f'<header class="site-header"><nav class="navbar"><ul class="nav">{items}</ul></nav></header>\n'
+
+
+def footer(rng):
+    columns = ''.join(f'<div class="col"><h4>{word}</h4><ul>'
+                      + ''.join(f'<li><a href="/f/{word}/{j}">{sentence(rng, 2)}</a></li>' for j in range(6))
+                      + '</ul></div>' for word in WORDS[:8])
+    return f'<footer class="footer">{columns}</footer>\n</body></html>\n'
+
+
+def filler(rng, blocks):
+    return ''.join(f'<div class="sidebar-block"><h3 class="sidebar-title">{sentence(rng, 3)}</h3>'
+                   f'<p class="text-muted">{sentence(rng, 25)}</p><span class="badge">{rng.randint(1, 999)}</span></div>'
+                   for _ in range(blocks))
+
+
+def results(rng, card, count=20):
+    return filler(rng, 10) + '<div class="results">' + ''.join(card(rng, i) for i in range(count)) + '</div>' + filler(rng, 10)
+
+
+def huggingface_card(rng, i):
+    return (f'<div class="model-card flex"><header><span class="icon"></span><h4 class="text-md">user{i}/model-{i}</h4></header>'
+            f'<a class="block" href="https://huggingface.co/user{i}/model-{i}"><div class="meta"><span>{sentence(rng, 4)}</span>'
+            '<svg viewBox="0 0 10 10"><path d="M0 0h10v10H0z"/></svg></div></a></div>')
+
+
+def zenodo_card(rng, i):
+    return (f'<div class="ui item"><div class="content"><span class="ui label">Software</span>'
+            f'<a class="result-item-title header" href="https://zenodo.org/records/{1000 + i}">{sentence(rng, 8)}</a>'
+            f'<div class="description">{sentence(rng, 40)}</div><div class="extra"><span>{sentence(rng, 3)}</span></div></div></div>')
+
+
+def figshare_card(rng, i):
+    tags = ''.join(f'<li>{word}</li>' for word in WORDS[:5])
+    return (f'<div class="card"><a class="search-result" href="https://figshare.com/articles/software/item/{2000 + i}">'
+            f'<h3>{sentence(rng, 8)}</h3></a><p>{sentence(rng, 30)}</p><ul class="tags">{tags}</ul></div>')
+
+
+def openreview_card(rng, i):
+    return (f'<li class="note"><h4><a class="note_content_title" href="/forum?id=abc{i}">{sentence(rng, 9)}</a></h4>'
+            f'<div class="note-authors">{sentence(rng, 6)}</div><div class="note-meta-info"><span class="date">2023</span></div>'
+            f'<div class="note-contents-collapse"><p>{sentence(rng, 50)}</p></div></li>')
+
+
+def codeocean_card(rng, i):
+    return (f'<div class="capsule-item"><a class="paper-title" href="https://codeocean.com/capsule/{3000 + i}/tree">{sentence(rng, 8)}</a>'
+            f'<div class="capsule-meta"><span>{sentence(rng, 4)}</span></div><p>{sentence(rng, 35)}</p></div>')
+
+
+def mendeley_card(rng, i):
+    return (f'<div class="search-result"><a class="search-result-title" href="https://data.mendeley.com/datasets/xyz{i}/1">{sentence(rng, 8)}</a>'
+            f'<p class="search-result-description">{sentence(rng, 40)}</p></div>')
+
+
+def github_repo(rng):
+    before = filler(rng, 30)
+    files = ''.join(f'<div class="Box-row"><a class="js-navigation-open" href="/o/r/blob/main/f{i}.py">f{i}.py</a>'
+                    f'<span class="commit-author">dev{i % 4}</span><span>{sentence(rng, 6)}</span></div>' for i in range(40))
+    readme = ''.join(f'<p>{sentence(rng, 40)}</p><pre><code>pip install thing{i}</code></pre>' for i in range(30))
+    return (before + f'<div class="file-navigation">{files}</div>'
+            f'<div id="readme"><article class="markdown-body entry-content container-lg" itemprop="text"><h1>Project</h1>{readme}</article></div>'
+            + filler(rng, 20))
+
+
+# fixture -> body, in the order they are generated
+PAGES = {
+    'huggingface': lambda rng: results(rng, huggingface_card),
+    'zenodo': lambda rng: results(rng, zenodo_card),
+    'figshare': lambda rng: results(rng, figshare_card),
+    'openreview': lambda rng: results(rng, openreview_card),
+    'codeocean': lambda rng: results(rng, codeocean_card),
+    'mendeley': lambda rng: results(rng, mendeley_card),
+    'github_repo': github_repo,
+}
+
+
+def make_page(rng, name):
+    # The body draws from rng before the head and footer do.
+    body = PAGES[name](rng)
+    return (head(rng, name) + '<body class="page">\n' + nav()
+            + f'<main class="main"><div class="container"><div class="row">{body}</div></div></main>\n' + footer(rng))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write the synthetic HTML fixtures for bench_html_extract.py.')
+    parser.add_argument('--out', default=FIXTURES, help='Directory to write the pages to')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    rng = random.Random(args.seed)
+    for name in PAGES:
+        html = make_page(rng, name)
+        with open(os.path.join(args.out, name + '.html'), 'w', encoding='utf-8') as page:
+            page.write(html)
+        print(f"{name}: {len(html) / 1024:.0f} KB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+"""Local stand-ins for every service the scripts talk to, for offline benchmarks.
+
+    python benchmarks/stand_in.py --port 8700 --latency 0.05 --error_rate 0.01 --rate_limit 20
+
+then run either script with --stand_in_url http://127.0.0.1:8700. The
+transport sends https://<host>/<path> to http://127.0.0.1:8700/<host>/<path>,
+so one server answers for GitHub (GraphQL and HTML), PapersWithCode,
+Crossref, doi.org, Hugging Face, Zenodo, Figshare, OpenReview, CodeOcean and
+Mendeley Data. Google web search and PDF downloads are not covered.
+
+Whether a paper has code, and on which platform, is a pure function of its
+title, so every run sees the same world and results can be checked.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Share of papers with code on each platform; the rest have none.
+PLATFORM_SHARES = [
+    ('paperswithcode', 0.40), ('github', 0.25), ('huggingface', 0.10), ('zenodo', 0.10),
+    ('figshare', 0.05), ('openreview', 0.04), ('codeocean', 0.03), ('mendeley', 0.03),
+]
+
+CROSSREF_PREFIX = '10.5555/bench.'  # DOIs Crossref knows; any other prefix only resolves through doi.org
+
+# Search-result pages: host -> (search path, platform, result link template, element template).
+SEARCH_PAGES = {
+    'huggingface.co': ('/models', 'huggingface', 'https://huggingface.co/bench/{slug}',
+                       '<div class="model-card"><a href="{url}"><h4>{slug}</h4></a></div>'),
+    'zenodo.org': ('/search', 'zenodo', 'https://zenodo.org/records/{slug}',
+                   '<a class="result-item-title" href="{url}">{title}</a>'),
+    'figshare.com': ('/search', 'figshare', 'https://figshare.com/articles/{slug}',
+                     '<a class="search-result" href="{url}">{title}</a>'),
+    'openreview.net': ('/search', 'openreview', 'https://openreview.net/code/{slug}',
+                       '<a class="note_content_title" href="{url}">{title}</a>'),
+    'codeocean.com': ('/explore', 'codeocean', 'https://codeocean.com/capsule/{slug}',
+                      '<a class="paper-title" href="{url}">{title}</a>'),
+    'data.mendeley.com': ('/search', 'mendeley', 'https://data.mendeley.com/datasets/{slug}',
+                          '<a class="search-result-title" href="{url}">{title}</a>'),
+}
+
+SEARCH_ALIAS_RE = re.compile(r'(s\d+): search\(query: \$(q\d+)')
+REPO_ALIAS_RE = re.compile(r'(r\d+): repository\(owner: \$(o\d+), name: \$(n\d+)\)')
+GITHUB_HOSTS = ('api.github.com', 'github.com')
+
+
+def title_hash(title):
+    normalized = ' '.join(re.findall(r'[a-z0-9]+', title.lower().replace('{', '').replace('}', '')))
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def slug_for(title):
+    return 'p' + title_hash(title)[:12]
+
+
+def doi_for(title):
+    return CROSSREF_PREFIX + title_hash(title)[:12]
+
+
+def paper_platform(title, code_rate=0.4):
+    """The platform that holds the paper's code, or None."""
+    draw = int(title_hash(title)[:8], 16) / 0xFFFFFFFF
+    if draw >= code_rate:
+        return None
+    draw /= code_rate
+    for platform, share in PLATFORM_SHARES:
+        if draw < share:
+            return platform
+        draw -= share
+    return PLATFORM_SHARES[-1][0]
+
+
+def in_crossref(title):
+    """Crossref can find roughly four in five titles."""
+    return int(title_hash(title)[8:10], 16) < 205
+
+
+class Bucket:
+    def __init__(self, rate, burst):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.updated = float(burst), time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class StandIn:
+    """A threaded HTTP server playing every upstream service, with tunable latency, errors and rate limits."""
+
+    def __init__(self, port=0, latency=0.0, error_rate=0.0, rate_limit=0.0, burst=None, retry_after=1,
+                 code_rate=0.4, page_kb=30, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.burst = burst or max(1, int(rate_limit * 2))
+        self.retry_after = retry_after
+        self.code_rate = code_rate
+        self.filler = self._filler(page_kb * 1024)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.readmes = {}  # repository path -> README text, for every repository a search has shown
+        self.counts = Counter()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @staticmethod
+    def _filler(size):
+        block = ('<div class="sidebar-block"><h3 class="sidebar-title">Related</h3><p class="text-muted">'
+                 + 'lorem ipsum dolor sit amet consectetur adipiscing elit ' * 8 + '</p></div>\n')
+        return block * max(0, size // len(block))
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_counts(self):
+        with self.lock:
+            self.counts.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+    # Behaviour shared by every host
+
+    def _admit(self, host):
+        """Simulated latency, rate limits and errors; returns (status, headers) to send instead, or None."""
+        with self.lock:
+            self.counts['requests'] += 1
+            self.counts['host:' + host] += 1
+            if self.rate_limit > 0:
+                bucket = self.buckets.setdefault(host, Bucket(self.rate_limit, self.burst))
+                if not bucket.take():
+                    self.counts['rate_limited'] += 1
+                    if host in GITHUB_HOSTS:
+                        return 403, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(int(time.time()) + self.retry_after)}
+                    return 429, {'Retry-After': str(self.retry_after)}
+            failed = self.random.random() < self.error_rate
+            jitter = self.random.uniform(0.5, 1.5)
+        if self.latency > 0:
+            time.sleep(self.latency * jitter)
+        if failed:
+            with self.lock:
+                self.counts['errors'] += 1
+            return 502, {}
+        return None
+
+    def _readme_page(self, title):
+        return (f'<html><head><title>{title}</title></head><body>{self.filler}'
+                f'<article class="markdown-body entry-content container-lg"><h1>{title}</h1>'
+                f'<p>Code for the paper "{title}".</p></article>'
+                f'<span class="commit-author">bench</span></body></html>')
+
+    def _show(self, path, title):
+        with self.lock:
+            self.readmes[path] = title
+
+    def _repo_node(self, owner, name):
+        with self.lock:
+            readme = self.readmes.get(f'{owner}/{name}')
+        if readme is None:
+            return None
+        return {'url': f'https://github.com/{owner}/{name}', 'updatedAt': '2015-01-01T00:00:00Z',
+                'owner': {'login': owner}, 'readmeMd': {'text': f'# {readme}\n\nCode for the paper.'},
+                'readmeRst': None, 'readmePlain': None, 'readmeLower': None,
+                'defaultBranchRef': {'target': {'history': {'nodes': [{'author': {'name': 'Bench Author', 'user': {'login': owner}}}]}}}}
+
+    # Per-service answers: each returns (status, content type, body)
+
+    def github_graphql(self, payload):
+        query, variables = payload.get('query', ''), payload.get('variables', {})
+        data = {}
+        for alias, var in SEARCH_ALIAS_RE.findall(query):
+            title = variables.get(var, '').replace(' sort:stars', '')
+            decoy = 'd' + title_hash(title)[:8]
+            self._show(f'decoy/{decoy}', 'unrelated project about something else entirely')
+            nodes = [self._repo_node('decoy', decoy)]
+            if paper_platform(title, self.code_rate) == 'github':
+                self._show(f'bench/{slug_for(title)}', title)
+                nodes.insert(0, self._repo_node('bench', slug_for(title)))
+            data[alias] = {'nodes': nodes}
+        for alias, owner_var, name_var in REPO_ALIAS_RE.findall(query):
+            data[alias] = self._repo_node(variables.get(owner_var), variables.get(name_var))
+        return 200, 'application/json', json.dumps({'data': data})
+
+    def github_html(self, path):
+        with self.lock:
+            title = self.readmes.get(path.strip('/'))
+        if title is None:
+            return 404, 'text/html', '<html><body>Not Found</body></html>'
+        return 200, 'text/html', self._readme_page(title)
+
+    def paperswithcode(self, params):
+        title = params.get('q', [''])[0]
+        results = []
+        if paper_platform(title, self.code_rate) == 'paperswithcode':
+            self._show(f'bench/{slug_for(title)}', title)
+            results.append({'repository': {'url': f'https://github.com/bench/{slug_for(title)}'}})
+        return 200, 'application/json', json.dumps({'count': len(results), 'results': results})
+
+    def search_page(self, host, path, params):
+        search_path, platform, link, element = SEARCH_PAGES[host]
+        if path.rstrip('/') != search_path:
+            slug = path.rstrip('/').rsplit('/', 1)[-1]
+            with self.lock:
+                title = self.readmes.get(f'{host}/{slug}')
+            if title is None:
+                return 404, 'text/html', '<html><body>Not Found</body></html>'
+            return 200, 'text/html', self._readme_page(title)
+        title = (params.get('q') or params.get('query') or params.get('search') or [''])[0]
+        results = ''
+        if paper_platform(title, self.code_rate) == platform:
+            slug = slug_for(title)
+            self._show(f'{host}/{slug}', title)
+            results = element.format(url=link.format(slug=slug), slug=slug, title=title)
+        return 200, 'text/html', f'<html><body>{self.filler}<div class="results">{results}</div>{self.filler}</body></html>'
+
+    def crossref(self, path, params):
+        if path.startswith('/works/'):
+            doi = path[len('/works/'):]
+            return 200, 'application/json', json.dumps({'message': {'DOI': doi, 'URL': f'https://doi.org/{doi}'}})
+        if 'filter' in params:
+            dois = [value[4:] for value in params['filter'][0].split(',') if value.startswith('doi:')]
+            items = [{'DOI': doi, 'abstract': f'<jats:p>Abstract of {doi}.</jats:p>'} for doi in dois
+                     if doi.lower().startswith(CROSSREF_PREFIX)]
+            return 200, 'application/json', json.dumps({'message': {'items': items}})
+        title = params.get('query.bibliographic', [''])[0]
+        items = [{'DOI': '10.5555/decoy.' + title_hash(title)[:6], 'title': ['An unrelated paper on another topic']}]
+        if in_crossref(title):
+            items.insert(0, {'DOI': doi_for(title), 'title': [title]})
+        return 200, 'application/json', json.dumps({'message': {'items': items}})
+
+    def doi(self, path, accept):
+        doi = path.strip('/')
+        if 'citationstyles' in (accept or ''):
+            return 200, 'application/json', json.dumps({'DOI': doi, 'abstract': f'<jats:p>Abstract of {doi}.</jats:p>'})
+        return 200, 'text/html', f'<html><body>{self.filler}<h1>{doi}</h1></body></html>'
+
+    def answer(self, method, host, path, params, body, headers):
+        if host == 'api.github.com' and method == 'POST':
+            return self.github_graphql(json.loads(body or b'{}'))
+        if host == 'github.com':
+            return self.github_html(path)
+        if host == 'paperswithcode.com':
+            return self.paperswithcode(params)
+        if host in SEARCH_PAGES:
+            return self.search_page(host, path, params)
+        if host == 'api.crossref.org':
+            return self.crossref(path, params)
+        if host == 'doi.org':
+            return self.doi(path, headers.get('Accept'))
+        return 404, 'text/plain', f'No stand-in for {host}'
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real services
+
+            def _serve(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                parts = urlsplit(self.path)
+                host, _, path = parts.path.lstrip('/').partition('/')
+                path = '/' + path
+                refused = stand_in._admit(host)
+                if refused:
+                    status, headers = refused
+                    content_type, text = 'text/plain', 'Slow down' if status in (403, 429) else 'Bad gateway'
+                else:
+                    headers = {}
+                    status, content_type, text = stand_in.answer(method, host, path, parse_qs(parts.query), body, self.headers)
+                payload = text.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._serve('GET')
+
+            def do_POST(self):
+                self._serve('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve stand-ins for every upstream service.')
+    parser.add_argument('--port', type=int, default=8700)
+    parser.add_argument('--latency', type=float, default=0.05, help='Mean seconds per response (jittered 0.5x-1.5x)')
+    parser.add_argument('--error_rate', type=float, default=0.0, help='Share of responses that are 502s')
+    parser.add_argument('--rate_limit', type=float, default=0.0, help='Requests/sec allowed per host before 429s (403s for GitHub); 0 for no limit')
+    parser.add_argument('--retry_after', type=int, default=1, help='Seconds rate-limited clients are told to wait')
+    parser.add_argument('--code_rate', type=float, default=0.4, help='Share of papers that have code somewhere')
+    parser.add_argument('--page_kb', type=int, default=30, help='Size of HTML pages')
+    args = parser.parse_args()
+    stand_in = StandIn(args.port, args.latency, args.error_rate, args.rate_limit, retry_after=args.retry_after,
+                       code_rate=args.code_rate, page_kb=args.page_kb)
+    print(f'Serving stand-ins on {stand_in.url}')
+    stand_in.server.serve_forever()
@@ -15,6 +15,7 @@ infile="/fs/class-projects/spring2024/cmsc828j/c828jg00/c828j001/codebase_finder
 outfolder="/fs/class-projects/spring2024/cmsc828j/c828jg00/c828j001/codebase_finder/output/"
 
 # Run the Python script
-srun python3 src/scrape_codebases_parallel.py \
+srun python3 src/add_abstract.py \
     --bib_file $infile \
-    --output_dir $outfolder 
\ No newline at end of file
+    --output_dir $outfolder \
+    --num_workers 16 
\ No newline at end of file
@@ -9,14 +9,20 @@
 #SBATCH --mem=100G                                  # Request 100 GB of memory
 #SBATCH -t 4:00:00                                 # set time limit [dd:hh:mm:ss]
 #SBATCH --job-name=codebase_scraper      # set job name
-#SBATCH --output=codebase_scraper.out    # set output name
+#SBATCH --output=codebase_scraper_%A_%a.out    # set output name, one per array task
+#SBATCH --array=0-7                      # one shard of the input per array task
+
+# Once every array task has finished, combine the shards:
+#   sbatch --dependency=afterok:<array job id> --wrap "python3 src/scrape_codebases_parallel.py merge --output_dir <outfolder>"
 
 infile="/fs/class-projects/spring2024/cmsc828j/c828jg00/c828j001/codebase_finder/data/symbol_survey_paper_cleaned_full_consolidated.bib"
 # infile="/fs/class-projects/spring2024/cmsc828j/c828jg00/c828j001/codebase_finder/data/test.bib"
 outfolder="/fs/class-projects/spring2024/cmsc828j/c828jg00/c828j001/codebase_finder/output"
 
-# Run the Python script
+# Run the Python script on this task's shard; all shards draw on one GitHub rate-limit budget
 srun python3 src/scrape_codebases_parallel.py \
     --bib_file $infile \
     --output_dir $outfolder \
+    --shard_index $SLURM_ARRAY_TASK_ID --shard_count $SLURM_ARRAY_TASK_COUNT \
+    --rate_budget_file $outfolder/rate_budget.json \
     --check_paper --num_threads 16 --search_web #--debug_valid_repo --check_author
\ No newline at end of file
@@ -1,14 +1,26 @@
 import argparse
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlencode
+import backoff
 import bibtexparser
 import requests
 from bibtexparser.bwriter import BibTexWriter
 from bibtexparser.bibdatabase import BibDatabase
+from http_cache import CACHE_MODES, configure_cache, is_cache_miss
+from rate_limit import RateLimited, configure_rate_limits, parse_limits, wait_out_rate_limits
+from transport import DEFAULT_MAX_PER_HOST, configure_transport, http_get
 
+CROSSREF_WORKS_URL = "https://api.crossref.org/works"
+CROSSREF_BATCH_SIZE = 20  # DOIs per Crossref filter query; longer filters make for unwieldy URLs
+mailto = None  # Contact address for Crossref's polite pool (--mailto)
+
+@backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_tries=5, giveup=is_cache_miss)
 def fetch_abstract(doi):
     url = f"https://doi.org/{doi}"
     headers = {"Accept": "application/vnd.citationstyles.csl+json"}
-    response = requests.get(url, headers=headers)
+    response = http_get(url, source='doi', headers=headers)
     if response.status_code == 200:
         data = response.json()
         return data.get("abstract")
@@ -16,31 +28,88 @@ def fetch_abstract(doi):
         print(f"Could not fetch abstract for DOI: {doi}")
         return None
 
-def add_abstracts_to_bibtex(input_file, output_folder):
+@backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_tries=5, giveup=is_cache_miss)
+def fetch_abstracts_crossref(dois):
+    """Look up many DOIs with one Crossref filter query.
+
+    Returns {doi: abstract or None} for the DOIs Crossref knows; DOIs missing
+    from the result are not Crossref DOIs and have to go through doi.org.
+    """
+    dois = sorted(dois)  # A stable URL, so re-runs hit the HTTP cache
+    params = {"filter": ",".join(f"doi:{doi}" for doi in dois), "rows": len(dois), "select": "DOI,abstract"}
+    if mailto:
+        params["mailto"] = mailto
+    query = urlencode(params)
+    response = http_get(f"{CROSSREF_WORKS_URL}?{query}", source='crossref')
+    if response.status_code != 200:
+        print(f"Crossref lookup of {len(dois)} DOIs failed with status {response.status_code}")
+        return {}
+    items = response.json().get("message", {}).get("items", [])
+    return {item["DOI"].lower(): item.get("abstract") for item in items if item.get("DOI")}
+
+def fetch_batch(dois):
+    """Abstracts for a batch of DOIs: Crossref first, doi.org for whatever Crossref does not have."""
+    found = {}
+    try:
+        found = wait_out_rate_limits(fetch_abstracts_crossref, dois)
+    except (requests.exceptions.RequestException, RateLimited, ValueError) as e:
+        print(f"Crossref batch lookup failed, falling back to doi.org: {e}")
+    abstracts = {}
+    for doi in dois:
+        if doi in found:
+            abstracts[doi] = found[doi]
+            continue
+        try:
+            abstracts[doi] = wait_out_rate_limits(fetch_abstract, doi)
+        except (requests.exceptions.RequestException, RateLimited, ValueError) as e:
+            print(f"Could not fetch abstract for DOI: {doi} ({e})")
+            abstracts[doi] = None
+    return abstracts
+
+def fetch_abstracts(dois, num_workers, batch_size=CROSSREF_BATCH_SIZE):
+    """Fetch the abstracts of all DOIs with num_workers batches in flight at a time."""
+    # Commas separate filter values, so DOIs containing one can only go through doi.org.
+    batchable = [doi for doi in dois if "," not in doi]
+    batches = [batchable[i:i + batch_size] for i in range(0, len(batchable), batch_size)]
+    batches += [[doi] for doi in dois if "," in doi]
+
+    def timed_batch(batch):
+        started = time.monotonic()
+        return fetch_batch(batch), time.monotonic() - started
+
+    abstracts = {}
+    with ThreadPoolExecutor(max_workers=max(1, num_workers)) as executor:
+        futures = [executor.submit(timed_batch, batch) for batch in batches]
+        for done, future in enumerate(as_completed(futures), start=1):
+            batch_abstracts, seconds = future.result()
+            abstracts.update(batch_abstracts)
+            print(f"Fetched batch {done} of {len(batches)}: {len(batch_abstracts)} DOIs in {seconds:.2f}s ({len(abstracts)} of {len(dois)} DOIs)")
+    return abstracts
+
+def add_abstracts_to_bibtex(input_file, output_folder, num_workers=1, batch_size=CROSSREF_BATCH_SIZE):
     with open(input_file, 'r') as bibtex_file:
         bib_database = bibtexparser.load(bibtex_file)
 
     total_entries = len(bib_database.entries)
-    updated_entries = []
-
-    for idx, entry in enumerate(bib_database.entries, start=1):
-        print(f"Processing entry {idx} of {total_entries}...")
-        if 'abstract' not in entry or not entry['abstract']:
-            doi = entry.get('doi')
-            if doi:
-                abstract = fetch_abstract(doi)
-                if abstract:
-                    entry['abstract'] = abstract
-                    print(f"Added abstract to entry {idx}")
-        
-        updated_entries.append(entry)
-        print(f"Finished processing entry {idx} of {total_entries}")
+    missing = [entry for entry in bib_database.entries if entry.get('doi') and not entry.get('abstract')]
+    dois = list(dict.fromkeys(entry['doi'].strip().lower() for entry in missing))
+    print(f"{len(missing)} of {total_entries} entries need an abstract ({len(dois)} distinct DOIs)")
+
+    abstracts = fetch_abstracts(dois, num_workers, batch_size)
+
+    # Abstracts are filled in by position after all fetches finish, so the output order never depends on timing.
+    added = 0
+    for entry in missing:
+        abstract = abstracts.get(entry['doi'].strip().lower())
+        if abstract:
+            entry['abstract'] = abstract
+            added += 1
+    print(f"Added abstracts to {added} of {total_entries} entries")
 
     # Write the updated entries to the output file
     writer = BibTexWriter()
     output_file = os.path.join(output_folder, "output_with_abstracts.bib")
     with open(output_file, 'w') as bibtex_file:
-        bib_database.entries = updated_entries
         bibtex_file.write(writer.write(bib_database))
     print(f"Output written to {output_file}")
 
@@ -48,7 +117,20 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Add abstracts to BibTeX entries.")
     parser.add_argument("--bib_file", type=str, help="Input BibTeX file.", required=True)
     parser.add_argument("--output_dir", type=str, help="Output folder for the new BibTeX file.", required=True)
+    parser.add_argument("--num_workers", type=int, default=8, help="Number of DOI batches fetched concurrently.")
+    parser.add_argument("--batch_size", type=int, default=CROSSREF_BATCH_SIZE, help="DOIs looked up per Crossref query.")
+    parser.add_argument("--mailto", type=str, default=None, help='Contact address sent with Crossref queries so they go to the faster "polite" pool.')
+    parser.add_argument("--max_per_host", type=int, default=DEFAULT_MAX_PER_HOST, help="Maximum number of concurrent requests to any single host.")
+    parser.add_argument("--rate_limits", type=str, default=None, help='Override per-source request rates, e.g. "crossref=5,doi=10:20" (requests/sec[:burst]).')
+    parser.add_argument("--stand_in_url", type=str, default=None, help="Send every request to this server instead, e.g. benchmarks/stand_in.py.")
+    parser.add_argument("--cache_dir", type=str, default=None, help="Directory for the HTTP response cache (default: <output_dir>/http_cache).")
+    parser.add_argument("--cache_mode", choices=CACHE_MODES, default="readwrite", help="off, read, readwrite or offline.")
+    parser.add_argument("--cache_max_mb", type=int, default=2048, help="Maximum size of the HTTP cache in MB.")
 
     args = parser.parse_args()
+    mailto = args.mailto
+    configure_transport(args.num_workers, args.max_per_host, stand_in_url=args.stand_in_url)
+    configure_rate_limits(parse_limits(args.rate_limits))
+    configure_cache(args.cache_dir or os.path.join(args.output_dir, "http_cache"), args.cache_mode, args.cache_max_mb * 1024 ** 2)
 
-    add_abstracts_to_bibtex(args.bib_file, args.output_dir)
+    add_abstracts_to_bibtex(args.bib_file, args.output_dir, args.num_workers, args.batch_size)
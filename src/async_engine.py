@@ -0,0 +1,144 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock
+
+from rate_limit import RateLimited, Reservations, get_rate_limiter, with_reservations
+from transport import cancel_scope
+
+# A call that hits a rate limit books the next free slot, is parked on the
+# event loop until then and retried; up to this many times, as long as each
+# wait is no longer than MAX_THROTTLE_WAIT.
+MAX_THROTTLE_RETRIES = 5
+MAX_THROTTLE_WAIT = 300.0
+
+_PENDING = object()
+
+
+def _hit(result):
+    return result is not _PENDING and not isinstance(result, RateLimited) and bool(result)
+
+
+class AsyncEngine:
+    """Drives blocking fetchers from one event loop, handing the actual I/O to a shared thread pool.
+
+    The HTTP stack (requests) is blocking, so the event loop
+    owns the scheduling - fan-out, priorities, cancellation - and the pool only
+    ever runs single calls.
+    """
+
+    def __init__(self, io_threads=16):
+        self.io_threads = io_threads
+        self.executor = ThreadPoolExecutor(max_workers=io_threads, thread_name_prefix='io')
+
+    async def run_blocking(self, func, *args, cancel_event=None):
+        """Run func(*args) on the I/O pool; requests it makes after cancel_event fires are skipped."""
+        def call():
+            if cancel_event is not None:
+                cancel_scope.set(cancel_event)
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, contextvars.copy_context().run, call)
+
+    async def run_throttled(self, func, *args, cancel_event=None):
+        """Like run_blocking, but a RateLimited call waits its turn on the event loop - not on a thread - and is retried."""
+        reserved = Reservations()
+        try:
+            for attempt in range(MAX_THROTTLE_RETRIES + 1):
+                try:
+                    return await self.run_blocking(with_reservations, reserved, func, *args, cancel_event=cancel_event)
+                except RateLimited as e:
+                    if attempt == MAX_THROTTLE_RETRIES or e.retry_after > MAX_THROTTLE_WAIT:
+                        raise
+                    get_rate_limiter().record_queued(e.source, e.retry_after)
+                    await asyncio.sleep(e.retry_after)
+        finally:
+            # Slots booked by a call that gave up or was cancelled go to the calls queued behind it.
+            get_rate_limiter().release(reserved)
+
+    async def first_hit(self, calls, width=None, order=None):
+        """Run (func, args) calls concurrently and return the first truthy result in list order.
+
+        A result only wins once every higher-priority call has come back empty,
+        and as soon as any call hits, every lower-priority call is cancelled.
+        Exceptions count as misses, except RateLimited: a call that gave up
+        while throttled might have won, so that is raised rather than a
+        lower-priority hit or None returned. With width, at most width calls
+        run at once, started as earlier ones come back empty: in the order of
+        the call indices in order if given, else in list order. order only
+        changes which calls start first, never which result wins.
+        """
+        width = width or len(calls)
+        queue = list(range(len(calls))) if order is None else list(order)
+        events = [Event() for _ in calls]
+        tasks = [None] * len(calls)
+        results = [_PENDING] * len(calls)
+        pending = set()
+        try:
+            while True:
+                while queue and len(pending) < width:
+                    index = queue.pop(0)
+                    func, args = calls[index]
+                    tasks[index] = asyncio.ensure_future(self.run_throttled(func, *args, cancel_event=events[index]))
+                    pending.add(tasks[index])
+                if not pending:
+                    return None
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index = tasks.index(task)
+                    error = None if task.cancelled() else task.exception()
+                    if isinstance(error, RateLimited):
+                        results[index] = error
+                    else:
+                        results[index] = None if task.cancelled() or error else task.result()
+                for index, result in enumerate(results):
+                    if result is _PENDING:
+                        break
+                    if isinstance(result, RateLimited):
+                        raise result
+                    if result:
+                        return result
+                hit = next((index for index, result in enumerate(results) if _hit(result)), None)
+                if hit is not None:
+                    # Calls past a hit could never win: cancel them, and only start the ones before it.
+                    queue = [index for index in queue if index < hit]
+                    for index in range(hit + 1, len(calls)):
+                        if tasks[index] in pending:
+                            self._cancel(tasks[index], events[index])
+                            pending.discard(tasks[index])
+                            results[index] = None
+        finally:
+            for task, event in zip(tasks, events):
+                if task is not None:
+                    self._cancel(task, event)
+
+    @staticmethod
+    def _cancel(task, event):
+        if not task.done():
+            event.set()
+            task.cancel()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_engine = None
+_engine_lock = Lock()
+
+
+def configure_engine(io_threads=16):
+    """Replace the process-wide engine with one using io_threads blocking workers."""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.shutdown()
+        _engine = AsyncEngine(io_threads)
+        return _engine
+
+
+def get_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AsyncEngine()
+        return _engine
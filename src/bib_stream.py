@@ -0,0 +1,120 @@
+import re
+
+from bibtexparser.bibdatabase import BibDatabase
+from bibtexparser.bparser import BibTexParser
+from bibtexparser.bwriter import BibTexWriter
+
+from matching import normalize_title
+
+CHUNK_CHARS = 1024 * 1024
+BLOCK_START_RE = re.compile(r'@\s*[A-Za-z]+\s*([{(])')
+BRACE_RE = re.compile(r'[{}]')
+PAREN_RE = re.compile(r'[{}()]')
+
+
+def iter_blocks(bibtex_file, chunk_chars=CHUNK_CHARS):
+    """Yield the text of each top-level @... block, reading the file a chunk at a time.
+
+    Text between blocks is skipped, as bibtexparser does with implicit
+    comments. A block that never closes is dropped.
+    """
+    buffer = ''
+    position = 0
+    eof = False
+    while True:
+        match = BLOCK_START_RE.search(buffer, position)
+        if match:
+            end = _block_end(buffer, match.end(), match.group(1))
+            if end is not None:
+                yield buffer[match.start():end]
+                position = end
+                continue
+        if eof:
+            return
+        # Keep the unfinished tail (or a possible '@' split across chunks) and read on.
+        if match:
+            tail = match.start()
+        else:
+            tail = buffer.rfind('@', position)
+            tail = tail if tail >= 0 else len(buffer)
+        buffer = buffer[tail:]
+        position = 0
+        chunk = bibtex_file.read(chunk_chars)
+        if not chunk:
+            eof = True
+        buffer += chunk
+
+
+def _block_end(text, start, opener):
+    """Index just past the delimiter closing a block opened right before start, or None if it is not in text."""
+    depth = 1
+    if opener == '{':
+        for brace in BRACE_RE.finditer(text, start):
+            depth += 1 if brace.group() == '{' else -1
+            if depth == 0:
+                return brace.end()
+        return None
+    braces = 0
+    for delimiter in PAREN_RE.finditer(text, start):
+        char = delimiter.group()
+        if char in '{}':
+            braces += 1 if char == '{' else -1
+        elif braces == 0:
+            depth += 1 if char == '(' else -1
+            if depth == 0:
+                return delimiter.end()
+    return None
+
+
+class BibStream:
+    """Parses a .bib file one entry at a time, with the same parser settings as bibtexparser.load.
+
+    @string macros, preambles and explicit comments are collected in
+    self.header as they go by and apply to the entries that follow them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.parser = BibTexParser()
+        self.parser.expect_multiple_parse = True
+        self.header = self.parser.bib_database
+
+    def __iter__(self):
+        with open(self.path, 'r', encoding='utf-8') as bibtex_file:
+            for block in iter_blocks(bibtex_file):
+                self.parser.parse(block, partial=True)
+                entries = self.header.entries
+                if entries:
+                    self.header.entries = []
+                    yield from entries
+
+
+def dedup_keys(entry, doi=None):
+    """Keys under which an entry counts as a duplicate of an earlier one: its DOI and its normalized title.
+
+    doi, if given, is keyed on instead of the entry's own; '' for none.
+    """
+    keys = []
+    doi = (entry.get('doi', '') if doi is None else doi).strip().lower()
+    if doi:
+        keys.append(hash(('doi', doi)))
+    title = normalize_title(entry.get('title', ''))
+    if title:
+        keys.append(hash(('title', title)))
+    return keys
+
+
+def entry_text(entry, writer=None):
+    """The BibTeX text of a single entry, formatted as bibtexparser.dump would."""
+    database = BibDatabase()
+    database.entries = [entry]
+    return (writer or BibTexWriter()).write(database)
+
+
+def header_text(header, writer=None):
+    """Comments, preambles and @string definitions of header, without entries."""
+    database = BibDatabase()
+    database.comments = header.comments
+    database.preambles = header.preambles
+    database.strings = header.strings
+    return (writer or BibTexWriter()).write(database)
@@ -0,0 +1,199 @@
+import json
+import os
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from threading import Lock
+from urllib.parse import urlencode
+
+import backoff
+import requests
+
+from http_cache import OfflineCacheMiss, is_cache_miss
+from jsonl_index import JsonlIndex
+from matching import normalize_title
+from metrics import metrics, record_backoff
+from rate_limit import RateLimited, wait_out_rate_limits
+from transport import http_get
+
+CROSSREF_WORKS_URL = 'https://api.crossref.org/works'
+MEMO_NAME = 'doi_memo.jsonl'
+
+# Crossref's top hit is often a different paper with a similar title, so the
+# candidates are re-scored against the entry's title. A DOI below
+# MIN_CONFIDENCE is not recorded at all; one below TRUSTED_CONFIDENCE is
+# recorded but not used to fetch the paper.
+MIN_CONFIDENCE = 0.6
+TRUSTED_CONFIDENCE = 0.9
+CANDIDATES = 5
+# Titles whose match is kept in memory; the others are read back from the memo file.
+MEMO_WINDOW = 4096
+
+DoiMatch = namedtuple('DoiMatch', ['doi', 'confidence'])
+NO_MATCH = DoiMatch(None, 0.0)
+
+
+def title_confidence(title, candidate):
+    """How sure we are that candidate is the same title, from 0 to 1."""
+    a, b = normalize_title(title), normalize_title(candidate)
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def entry_confidence(entry):
+    """Confidence of the entry's DOI; DOIs that came with the input file are trusted fully."""
+    if not entry.get('doi'):
+        return 0.0
+    try:
+        return float(entry.get('doi_confidence', 1.0))
+    except ValueError:
+        return 0.0
+
+
+def trusted_doi(entry, min_confidence=TRUSTED_CONFIDENCE):
+    """The entry's DOI if it is safe to act on, else ''."""
+    return entry.get('doi', '') if entry_confidence(entry) >= min_confidence else ''
+
+
+class DoiResolver:
+    """Finds DOIs for entries that have none, querying Crossref once per distinct title.
+
+    Results, misses included, are appended to a memo file so later runs do
+    not ask again. Titles shared with an entry that already has a DOI reuse
+    that DOI without any request. Only the most recently used memo_window
+    titles are held in memory; the rest are found through an on-disk index
+    of the memo file.
+    """
+
+    def __init__(self, memo_path=None, mailto=None, workers=8, memo_window=MEMO_WINDOW):
+        self.memo_path = memo_path
+        self.mailto = mailto
+        self.workers = workers
+        self.memo_window = memo_window
+        self.memo = OrderedDict()
+        self.lock = Lock()
+        self.index = JsonlIndex(memo_path, lambda record: record['title']) if memo_path else None
+
+    def _recall(self, key):
+        """The memoized DoiMatch for key, or None; call with the lock held."""
+        match = self.memo.get(key)
+        if match is None and self.index is not None:
+            offset = self.index.get(key)
+            if offset is not None:
+                with open(self.memo_path, 'rb') as memo_file:
+                    memo_file.seek(offset)
+                    record = json.loads(memo_file.readline())
+                match = DoiMatch(record['doi'], record['confidence'])
+        if match is not None:
+            self._keep(key, match)
+        return match
+
+    def _keep(self, key, match):
+        """Put key at the recent end of the in-memory memo; call with the lock held."""
+        self.memo[key] = match
+        self.memo.move_to_end(key)
+        while len(self.memo) > self.memo_window:
+            self.memo.popitem(last=False)
+
+    def _remember(self, key, match):
+        with self.lock:
+            self._keep(key, match)
+            if self.memo_path:
+                line = (json.dumps({'title': key, 'doi': match.doi, 'confidence': match.confidence}) + '\n').encode('utf-8')
+                with open(self.memo_path, 'ab') as memo_file:
+                    offset = memo_file.tell()
+                    memo_file.write(line)
+                self.index.add(key, offset)
+                self.index.commit(offset + len(line))
+
+    @backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_tries=5, giveup=is_cache_miss, on_backoff=record_backoff)
+    def query(self, title):
+        """Ask Crossref for title and return its best re-scored candidate."""
+        params = {'query.bibliographic': title, 'rows': CANDIDATES, 'select': 'DOI,title'}
+        if self.mailto:
+            # Identified requests go to Crossref's "polite" pool, which is faster and more reliable.
+            params['mailto'] = self.mailto
+        response = http_get(f"{CROSSREF_WORKS_URL}?{urlencode(params)}", source='crossref')
+        response.raise_for_status()
+        best = NO_MATCH
+        for item in response.json().get('message', {}).get('items', []):
+            for candidate in item.get('title') or []:
+                confidence = round(title_confidence(title, candidate), 3)
+                if item.get('DOI') and confidence > best.confidence:
+                    best = DoiMatch(item['DOI'], confidence)
+        return best if best.confidence >= MIN_CONFIDENCE else NO_MATCH
+
+    def lookup(self, title):
+        """DoiMatch for title, from the memo or from Crossref; failed lookups are not memoized."""
+        key = normalize_title(title)
+        if not key:
+            return NO_MATCH
+        with self.lock:
+            match = self._recall(key)
+        if match is not None:
+            metrics.count('doi_lookups_total', result='memo')
+            return match
+        try:
+            match = wait_out_rate_limits(self.query, title)
+        except OfflineCacheMiss:
+            metrics.count('doi_lookups_total', result='offline')
+            return NO_MATCH
+        except (requests.exceptions.RequestException, RateLimited, ValueError) as e:
+            metrics.count('doi_lookups_total', result='error')
+            print(f"Error fetching DOI for title '{title}': {e}")
+            return NO_MATCH
+        metrics.count('doi_lookups_total', result='found' if match.doi else 'not_found')
+        self._remember(key, match)
+        return match
+
+    def resolve(self, entries, siblings=()):
+        """Add doi and doi_confidence to every entry without a DOI that Crossref can place.
+
+        siblings are further entries whose DOIs may be reused; they are not changed.
+        """
+        known = {}
+        for entry in list(entries) + list(siblings):
+            key = normalize_title(entry.get('title', ''))
+            if entry.get('doi') and key and entry_confidence(entry) >= TRUSTED_CONFIDENCE:
+                known.setdefault(key, entry['doi'])
+        missing = {}
+        resolved = 0
+        for entry in entries:
+            if 'doi' in entry:
+                continue
+            key = normalize_title(entry.get('title', ''))
+            if key in known:
+                entry['doi'], entry['doi_confidence'] = known[key], '1.0'
+                resolved += 1
+            elif key:
+                missing.setdefault(key, []).append(entry)
+        if not missing:
+            return resolved
+        titles = [group[0].get('title', '') for group in missing.values()]
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            matches = list(executor.map(self.lookup, titles))
+        for group, match in zip(missing.values(), matches):
+            if match.doi:
+                for entry in group:
+                    entry['doi'], entry['doi_confidence'] = match.doi, str(match.confidence)
+                    resolved += 1
+        return resolved
+
+
+_resolver = DoiResolver()
+
+
+def configure_doi_resolver(output_dir=None, mailto=None, workers=8, memo_path=None):
+    """Replace the process-wide resolver; the memo lives in output_dir unless memo_path is given."""
+    global _resolver
+    if memo_path is None and output_dir:
+        memo_path = os.path.join(output_dir, MEMO_NAME)
+    _resolver = DoiResolver(memo_path, mailto, workers)
+    return _resolver
+
+
+def get_doi_resolver():
+    return _resolver
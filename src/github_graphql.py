@@ -0,0 +1,182 @@
+import contextvars
+from collections import namedtuple
+from concurrent.futures import Future
+from datetime import datetime
+from threading import Lock, Timer
+from urllib.parse import urlsplit
+
+from http_cache import cached_value
+from repo_validation import normalize_repo_url
+from transport import http_post
+
+GRAPHQL_URL = 'https://api.github.com/graphql'
+
+# Everything validation needs about a repository, fetched in the same request
+# as the repository itself. updated_at is a datetime so RepoMeta can stand in
+# for a PyGithub Repository in validate_repository. readme is None unless the
+# README has one of the names in REPO_FIELDS; callers then read the public page.
+RepoMeta = namedtuple('RepoMeta', ['url', 'updated_at', 'readme', 'owner', 'contributors'])
+
+REPO_FIELDS = '''
+    url
+    updatedAt
+    owner { login }
+    readmeMd: object(expression: "HEAD:README.md") { ... on Blob { text } }
+    readmeRst: object(expression: "HEAD:README.rst") { ... on Blob { text } }
+    readmePlain: object(expression: "HEAD:README") { ... on Blob { text } }
+    readmeLower: object(expression: "HEAD:readme.md") { ... on Blob { text } }
+    defaultBranchRef {
+      target {
+        ... on Commit { history(first: 30) { nodes { author { name user { login } } } } }
+      }
+    }
+'''
+
+
+class GraphQLError(Exception):
+    """The GraphQL endpoint answered without any data."""
+
+
+def repo_meta(node):
+    """Turn a Repository node into RepoMeta."""
+    readme = None
+    for alias in ('readmeMd', 'readmeRst', 'readmePlain', 'readmeLower'):
+        blob = node.get(alias) or {}
+        if blob.get('text'):
+            readme = blob['text']
+            break
+    contributors = []
+    target = (node.get('defaultBranchRef') or {}).get('target') or {}
+    for commit in (target.get('history') or {}).get('nodes') or []:
+        author = commit.get('author') or {}
+        for name in ((author.get('user') or {}).get('login'), author.get('name')):
+            if name and name not in contributors:
+                contributors.append(name)
+    updated_at = datetime.strptime(node['updatedAt'], '%Y-%m-%dT%H:%M:%SZ')
+    return RepoMeta(node['url'], updated_at, readme, node['owner']['login'], contributors)
+
+
+class MicroBatcher:
+    """Coalesces single-item lookups from many threads into one batched call.
+
+    Items wait up to max_wait seconds for others to join, or go out at once
+    when max_size are pending. Identical items in flight share one result.
+    """
+
+    def __init__(self, fetch_many, max_size=25, max_wait=0.05):
+        self.fetch_many = fetch_many
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.pending = {}
+        self.timer = None
+        self.lock = Lock()
+
+    def get(self, item):
+        batch = None
+        with self.lock:
+            future = self.pending.get(item)
+            if future is None:
+                future = Future()
+                self.pending[item] = future
+                if len(self.pending) >= self.max_size:
+                    batch = self._take()
+                elif self.timer is None:
+                    self.timer = Timer(self.max_wait, self.flush)
+                    self.timer.daemon = True
+                    self.timer.start()
+        if batch:
+            self._run(batch)
+        return future.result()
+
+    def _take(self):
+        batch, self.pending = self.pending, {}
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        return batch
+
+    def flush(self):
+        with self.lock:
+            batch = self._take()
+        if batch:
+            self._run(batch)
+
+    def _run(self, batch):
+        try:
+            # A fresh context: the batch serves many callers, so no single caller's cancellation applies to it.
+            results = contextvars.Context().run(self.fetch_many, list(batch))
+        except BaseException as e:
+            for future in batch.values():
+                future.set_exception(e)
+            return
+        for item, future in batch.items():
+            future.set_result(results.get(item))
+
+
+class GitHubGraphQL:
+    """GitHub lookups through the GraphQL API, many repositories or searches per request.
+
+    Results go into the HTTP cache one repository or title at a time, under
+    the 'github' TTL, rather than per POST: which lookups share a batch
+    changes from run to run.
+    """
+
+    def __init__(self, token, endpoint=GRAPHQL_URL, batch_size=25, search_batch_size=5, search_results=10):
+        self.token = token
+        self.endpoint = endpoint
+        self.search_results = search_results
+        self.repo_batcher = MicroBatcher(self.fetch_repos, max_size=batch_size)
+        self.search_batcher = MicroBatcher(self.search_many, max_size=search_batch_size)
+
+    def query(self, query, variables):
+        response = http_post(self.endpoint, source='github_graphql', json={'query': query, 'variables': variables},
+                             headers={'Authorization': f'bearer {self.token}'})
+        response.raise_for_status()
+        payload = response.json()
+        if payload.get('data') is None:
+            raise GraphQLError(f"GitHub GraphQL query failed: {payload.get('errors')}")
+        return payload['data']
+
+    def fetch_repos(self, urls):
+        """Map each github.com URL to its Repository node, or None if the repository does not exist."""
+        names = {}
+        for url in urls:
+            segments = [segment for segment in urlsplit(normalize_repo_url(url)).path.split('/') if segment]
+            if len(segments) == 2:
+                names[url] = segments
+        if not names:
+            return {url: None for url in urls}
+        params, fields, variables = [], [], {}
+        for i, (owner, name) in enumerate(names.values()):
+            params.append(f'$o{i}: String!, $n{i}: String!')
+            fields.append(f'r{i}: repository(owner: $o{i}, name: $n{i}) {{ {REPO_FIELDS} }}')
+            variables[f'o{i}'] = owner
+            variables[f'n{i}'] = name
+        data = self.query(f"query({', '.join(params)}) {{ {' '.join(fields)} }}", variables)
+        results = {url: None for url in urls}
+        for i, url in enumerate(names):
+            results[url] = data.get(f'r{i}') or None
+        return results
+
+    def search_many(self, titles):
+        """Map each title to the Repository nodes of its top repository search results, best first."""
+        params, fields, variables = [], [], {}
+        for i, title in enumerate(titles):
+            params.append(f'$q{i}: String!')
+            fields.append(f's{i}: search(query: $q{i}, type: REPOSITORY, first: {self.search_results}) '
+                          f'{{ nodes {{ ... on Repository {{ {REPO_FIELDS} }} }} }}')
+            variables[f'q{i}'] = f'{title} sort:stars'
+        data = self.query(f"query({', '.join(params)}) {{ {' '.join(fields)} }}", variables)
+        return {title: [node for node in (data.get(f's{i}') or {}).get('nodes') or [] if node]
+                for i, title in enumerate(titles)}
+
+    def repo(self, url):
+        """RepoMeta for one URL, or None if it does not exist; batched with concurrent lookups from other threads."""
+        node = cached_value(f'{self.endpoint}#repository={normalize_repo_url(url)}', 'github',
+                            lambda: self.repo_batcher.get(url))
+        return repo_meta(node) if node else None
+
+    def search(self, title):
+        """RepoMeta of the search results for one title, batched with concurrent searches from other threads."""
+        nodes = cached_value(f'{self.endpoint}#search={title}', 'github', lambda: self.search_batcher.get(title))
+        return [repo_meta(node) for node in nodes]
@@ -0,0 +1,166 @@
+from collections import namedtuple
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+# What to pull out of a page: elements named tag (any tag if None) carrying
+# all of classes; from each, either attr of its first descendant child that
+# has it, attr of the element itself, or (text=True) its text content.
+Selector = namedtuple('Selector', ['tag', 'classes', 'child', 'attr', 'text'], defaults=(None, None, None, None, False))
+
+SELECTORS = {
+    'huggingface': Selector('div', ('model-card',), child='a', attr='href'),
+    'zenodo': Selector('a', ('result-item-title',), attr='href'),
+    'figshare': Selector('a', ('search-result',), attr='href'),
+    'openreview': Selector('a', ('note_content_title',), attr='href'),
+    'codeocean': Selector('a', ('paper-title',), attr='href'),
+    'mendeley': Selector('a', ('search-result-title',), attr='href'),
+    'all_links': Selector('a', attr='href'),
+    'github_readme': Selector('article', ('markdown-body', 'entry-content', 'container-lg'), text=True),
+    'github_commit_authors': Selector(None, ('commit-author',), text=True),
+}
+
+PARSERS = ('fast', 'bs4')
+_parser = 'fast'
+
+
+class _Done(Exception):
+    """Raised inside the parser once enough matches have been found."""
+
+
+class _SelectorParser(HTMLParser):
+    """Streams through a page keeping only the elements that match one selector."""
+
+    def __init__(self, selector, limit):
+        super().__init__(convert_charrefs=True)
+        self.selector = selector
+        self.limit = limit
+        self.results = []
+        self.open_tag = None  # tag of the matched element we are inside
+        self.nesting = 0
+        self.found_child = False
+        self.text = []
+
+    def _matches(self, tag, attrs):
+        if self.selector.tag and tag != self.selector.tag:
+            return False
+        if self.selector.classes:
+            classes = (dict(attrs).get('class') or '').split()
+            return all(name in classes for name in self.selector.classes)
+        return True
+
+    def _add(self, value):
+        self.results.append(value)
+        if self.limit and len(self.results) >= self.limit:
+            raise _Done()
+
+    def handle_starttag(self, tag, attrs):
+        selector = self.selector
+        if self.open_tag is None:
+            if not self._matches(tag, attrs):
+                return
+            if selector.attr and not selector.child:
+                value = dict(attrs).get(selector.attr)
+                if value is not None:
+                    self._add(value)
+                return
+            self.open_tag, self.nesting, self.found_child, self.text = tag, 1, False, []
+            return
+        if tag == self.open_tag:
+            self.nesting += 1
+        if selector.child and not self.found_child and tag == selector.child:
+            value = dict(attrs).get(selector.attr)
+            if value is not None:
+                self.found_child = True
+                self._add(value)
+
+    def handle_endtag(self, tag):
+        if self.open_tag is None or tag != self.open_tag:
+            return
+        self.nesting -= 1
+        if self.nesting == 0:
+            self.open_tag = None
+            if self.selector.text:
+                self._add(''.join(self.text))
+
+    def handle_data(self, data):
+        if self.open_tag is not None and self.selector.text:
+            self.text.append(data)
+
+    def close(self):
+        super().close()
+        if self.open_tag is not None and self.selector.text:
+            # Unclosed container at the end of the page: keep what we have, like BeautifulSoup does.
+            self.open_tag = None
+            self._add(''.join(self.text))
+
+
+def _start_offset(html, selector):
+    """Where parsing has to start, or -1 if no element in the page can match.
+
+    A class name that never occurs in the page means nothing can match, and
+    nothing before the first occurrence can either.
+    """
+    if not selector.classes:
+        return 0
+    first = html.find(selector.classes[0])
+    if first < 0:
+        return -1
+    return max(0, html.rfind('<', 0, first))
+
+
+def extract_fast(html, selector, limit=None):
+    start = _start_offset(html, selector)
+    if start < 0:
+        return []
+    parser = _SelectorParser(selector, limit)
+    try:
+        parser.feed(html[start:] if start else html)
+        parser.close()
+    except _Done:
+        pass
+    return parser.results
+
+
+def extract_bs4(html, selector, limit=None):
+    soup = BeautifulSoup(html, 'html.parser')
+    css = (selector.tag or '') + ''.join('.' + name for name in selector.classes or ())
+    results = []
+    for element in soup.select(css or '*'):
+        if selector.child:
+            child = element.find(selector.child, attrs={selector.attr: True})
+            value = child[selector.attr] if child else None
+        elif selector.attr:
+            value = element.get(selector.attr)
+        else:
+            value = element.get_text()
+        if value is not None:
+            results.append(value)
+            if limit and len(results) >= limit:
+                break
+    return results
+
+
+def configure_html_parser(parser):
+    """Pick 'fast' (streaming, BeautifulSoup only as a fallback) or 'bs4' (always BeautifulSoup)."""
+    global _parser
+    if parser not in PARSERS:
+        raise ValueError(f"Unknown HTML parser '{parser}', expected one of {PARSERS}")
+    _parser = parser
+
+
+def extract(html, name, limit=None):
+    """Values picked out of html by the selector registered under name, in document order."""
+    selector = SELECTORS[name]
+    if _parser == 'fast':
+        try:
+            return extract_fast(html, selector, limit)
+        except Exception:
+            pass
+    return extract_bs4(html, selector, limit)
+
+
+def extract_first(html, name):
+    """The first value the selector finds, or None."""
+    values = extract(html, name, limit=1)
+    return values[0] if values else None
@@ -0,0 +1,287 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from http.client import responses as http_reasons
+from threading import Lock
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from metrics import metrics
+from rate_limit import source_setting
+
+CACHE_MODES = ('off', 'read', 'readwrite', 'offline')
+
+DAY = 24 * 3600
+
+# How long a cached response stays fresh, per source. Search pages change more
+# often than DOI metadata, so they expire sooner. PDFs are streamed past the
+# cache, so they have no entry; 'github' covers GitHub GraphQL results and
+# 'web' every 'web:<host>' source, the pages on hosts that are not platforms.
+DEFAULT_TTLS = {
+    'default': 7 * DAY,
+    'doi': 90 * DAY,
+    'crossref': 30 * DAY,
+    'github': 1 * DAY,
+    'github_html': 3 * DAY,
+    'paperswithcode': 7 * DAY,
+    'huggingface': 7 * DAY,
+    'zenodo': 7 * DAY,
+    'figshare': 7 * DAY,
+    'openreview': 7 * DAY,
+    'codeocean': 7 * DAY,
+    'mendeley': 7 * DAY,
+    'web': 3 * DAY,
+}
+
+# Only these request headers change what the server sends back, so only these
+# take part in the cache key.
+VARY_HEADERS = ('accept', 'accept-language', 'authorization')
+
+# 404/410 are cached too so that dead links are not re-fetched on every run.
+CACHEABLE_STATUSES = (200, 203, 300, 301, 404, 410)
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# Access times of cache hits are written this many at a time, each batch in a
+# transaction of its own, so that reading never holds SQLite's write lock -
+# which other processes sharing the cache directory need - beyond a commit.
+ACCESS_BATCH = 256
+
+
+class OfflineCacheMiss(requests.exceptions.RequestException):
+    """Raised in offline mode when a URL has never been fetched before."""
+
+
+def is_cache_miss(e):
+    """Tell backoff not to retry offline cache misses."""
+    return isinstance(e, OfflineCacheMiss)
+
+
+def cache_key(method, url, headers=None):
+    """Content-address a request by method, URL and the headers that vary the response."""
+    vary = []
+    for name, value in sorted((headers or {}).items(), key=lambda item: item[0].lower()):
+        if name.lower() in VARY_HEADERS:
+            vary.append(f"{name.lower()}:{value}")
+    raw = "\n".join([method.upper(), url] + vary)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def build_response(url, status, headers, body):
+    """Rebuild a requests.Response from a cached row so callers cannot tell the difference."""
+    response = requests.models.Response()
+    response.status_code = status
+    response.reason = http_reasons.get(status, '')
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = body
+    response.url = url
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response.from_cache = True
+    return response
+
+
+class HTTPCache:
+    """SQLite-backed HTTP response cache with per-source TTLs and LRU size bound."""
+
+    def __init__(self, cache_dir, mode='readwrite', ttls=None, max_bytes=DEFAULT_MAX_BYTES):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{mode}', expected one of {CACHE_MODES}")
+        os.makedirs(cache_dir, exist_ok=True)
+        self.mode = mode
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.max_bytes = max_bytes
+        self.path = os.path.join(cache_dir, 'http_cache.sqlite')
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.accessed = {}  # key -> access time not yet written
+        self.conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, source TEXT, url TEXT, status INTEGER, headers TEXT, '
+            'body BLOB, stored_at REAL, accessed_at REAL, size INTEGER)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)')
+        self.conn.commit()
+        self.total_bytes = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def ttl(self, source):
+        return source_setting(self.ttls, source)
+
+    def get(self, key, source, stale=False):
+        """Return a fresh cached response or None.
+
+        With stale, and always in offline mode, an expired response is
+        returned too - an old answer beats none when the network is not an option.
+        """
+        now = time.time()
+        stale = stale or self.mode == 'offline'
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT url, status, headers, body, stored_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or (not stale and now - row[4] > self.ttl(source)):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.accessed[key] = now
+            if len(self.accessed) >= ACCESS_BATCH:
+                try:
+                    self._write_accessed()
+                except sqlite3.Error:
+                    pass  # Only access times, used to pick what to evict, are lost; the hit stands.
+        url, status, headers, body, _ = row
+        return build_response(url, status, json.loads(headers), body)
+
+    def put(self, key, source, response):
+        """Store a response and evict least-recently-used rows past the size bound."""
+        headers = {k: v for k, v in response.headers.items() if k.lower() != 'set-cookie'}
+        body = response.content
+        size = len(body) + len(response.url)
+        now = time.time()
+        with self.lock:
+            self.accessed.pop(key, None)
+            total_bytes = self.total_bytes
+            try:
+                old = self.conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+                if old:
+                    self.total_bytes -= old[0]
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (key, source, response.url, response.status_code, json.dumps(headers), body, now, now, size),
+                )
+                self.total_bytes += size
+                if self.total_bytes > self.max_bytes:
+                    self._write_accessed()
+                    self._evict()
+                self.conn.commit()
+            except sqlite3.Error:
+                self.conn.rollback()
+                self.total_bytes = total_bytes
+                raise
+
+    def _write_accessed(self):
+        """Write the pending access times and commit; call with the lock held."""
+        accessed, self.accessed = self.accessed, {}
+        try:
+            self.conn.executemany('UPDATE responses SET accessed_at = ? WHERE key = ?',
+                                  [(when, key) for key, when in accessed.items()])
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+    def _evict(self):
+        """Drop oldest-accessed rows until the cache is back under 90% of its bound."""
+        target = int(self.max_bytes * 0.9)
+        rows = self.conn.execute('SELECT key, size FROM responses ORDER BY accessed_at')
+        doomed = []
+        for key, size in rows:
+            if self.total_bytes <= target:
+                break
+            doomed.append((key,))
+            self.total_bytes -= size
+        self.conn.executemany('DELETE FROM responses WHERE key = ?', doomed)
+
+    def close(self):
+        with self.lock:
+            try:
+                self._write_accessed()
+            except sqlite3.Error:
+                pass
+            self.conn.close()
+
+
+_cache = None
+
+
+def configure_cache(cache_dir, mode='readwrite', max_bytes=DEFAULT_MAX_BYTES):
+    """Set up the process-wide cache used by cached_get."""
+    global _cache
+    if _cache is not None:
+        _cache.close()
+    _cache = None if mode == 'off' or not cache_dir else HTTPCache(cache_dir, mode, max_bytes=max_bytes)
+    return _cache
+
+
+def get_cache():
+    return _cache
+
+
+def _lookup(cache, key, source, stale=False):
+    """cache.get, treating a cache that cannot be read - locked, corrupt, gone - as a miss."""
+    try:
+        return cache.get(key, source, stale)
+    except sqlite3.Error as e:
+        metrics.count('http_cache_errors_total', source=source, op='get', error=type(e).__name__)
+        return None
+
+
+def _store(cache, key, source, response):
+    """cache.put, skipping the response if the cache cannot be written."""
+    try:
+        cache.put(key, source, response)
+    except sqlite3.Error as e:
+        metrics.count('http_cache_errors_total', source=source, op='put', error=type(e).__name__)
+
+
+def cached_get(url, source='default', headers=None, fetch=requests.get, **kwargs):
+    """Drop-in replacement for requests.get that goes through the configured cache."""
+    cache = _cache
+    if cache is None:
+        return fetch(url, headers=headers, **kwargs)
+    key = cache_key('GET', url, headers)
+    cached = _lookup(cache, key, source)
+    metrics.count('http_cache_lookups_total', source=source, result='miss' if cached is None else 'hit')
+    if cached is not None:
+        return cached
+    if cache.mode == 'offline':
+        raise OfflineCacheMiss(f"Offline mode: '{url}' is not in the cache")
+    try:
+        response = fetch(url, headers=headers, **kwargs)
+    except requests.exceptions.RequestException:
+        # The network failed: serve an expired copy if there is one.
+        stale = _lookup(cache, key, source, stale=True)
+        if stale is None:
+            raise
+        metrics.count('http_cache_lookups_total', source=source, result='stale')
+        return stale
+    if cache.mode == 'readwrite' and response.status_code in CACHEABLE_STATUSES:
+        _store(cache, key, source, response)
+    return response
+
+
+def cached_value(name, source, compute):
+    """compute() through the configured cache, stored as JSON under name.
+
+    For answers that do not come from a GET of their own: GitHub GraphQL
+    answers many lookups per POST, and which ones share a POST changes from
+    run to run, so each lookup's result is cached on its own.
+    """
+    cache = _cache
+    if cache is None:
+        return compute()
+    key = cache_key('VALUE', name)
+    cached = _lookup(cache, key, source)
+    metrics.count('http_cache_lookups_total', source=source, result='miss' if cached is None else 'hit')
+    if cached is not None:
+        return cached.json()
+    if cache.mode == 'offline':
+        raise OfflineCacheMiss(f"Offline mode: '{name}' is not in the cache")
+    try:
+        value = compute()
+    except requests.exceptions.RequestException:
+        stale = _lookup(cache, key, source, stale=True)
+        if stale is None:
+            raise
+        metrics.count('http_cache_lookups_total', source=source, result='stale')
+        return stale.json()
+    if cache.mode == 'readwrite':
+        body = json.dumps(value).encode('utf-8')
+        _store(cache, key, source, build_response(name, 200, {'Content-Type': 'application/json'}, body))
+    return value
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import time
+
+from jsonl_index import JsonlIndex
+from metrics import TimedLock
+
+JOURNAL_NAME = 'journal.jsonl'
+
+
+def entry_fingerprint(entry):
+    """Hash an input entry so that an edited entry is processed again on resume."""
+    raw = json.dumps(entry, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def index_key(key, fingerprint):
+    """The journal index key of an entry's records."""
+    return json.dumps([key, fingerprint], ensure_ascii=False)
+
+
+def record_index_key(record):
+    return index_key(record['key'], record['hash'])
+
+
+class OutputJournal:
+    """Append-only record of finished entries, one JSON line each.
+
+    Lines are flushed as they are written but only fsynced every sync_every
+    records or sync_interval seconds, whichever comes first. A crash can lose
+    at most that window, and a torn last line is ignored on load. Which
+    entries are done, and where their records are, is kept in an on-disk
+    JsonlIndex, so memory does not grow with the journal.
+    """
+
+    def __init__(self, output_dir, sync_every=50, sync_interval=5.0):
+        self.path = os.path.join(output_dir, JOURNAL_NAME)
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.lock = TimedLock('journal')
+        self._drop_torn_tail()
+        self.index = JsonlIndex(self.path, record_index_key)
+        self.file = open(self.path, 'ab')
+        self.size = self.file.tell()
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def _drop_torn_tail(self):
+        """Cut a half-written last line left by a crash, so the next record starts on a line of its own."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as journal_file:
+            end = journal_file.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                step = min(64 * 1024, position)
+                journal_file.seek(position - step)
+                newline = journal_file.read(step).rfind(b'\n')
+                if newline >= 0:
+                    position = position - step + newline + 1
+                    break
+                position -= step
+            if position != end:
+                journal_file.truncate(position)
+
+    def records(self):
+        """Yield every complete record in the journal, oldest first."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as journal_file:
+            for line in journal_file:
+                if not line.endswith('\n'):
+                    break
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def is_done(self, key, fingerprint):
+        return self.index.get(index_key(key, fingerprint)) is not None
+
+    def record(self, key, fingerprint, entry, has_code, seconds=None):
+        """Append the finished entry, with how long it took to process, and fsync if the batch is full."""
+        record = {'key': key, 'hash': fingerprint, 'has_code': has_code, 'entry': entry}
+        if seconds is not None:
+            record['seconds'] = round(seconds, 3)
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            self.index.add(index_key(key, fingerprint), self.size)
+            self.size += len(line)
+            self.unsynced += 1
+            if self.unsynced >= self.sync_every or time.monotonic() - self.last_sync >= self.sync_interval:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self.file.fileno())
+        self.index.commit(self.size)
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self._sync()
+                self.file.close()
+                self.index.close()
+
+    def compact(self, order, template, save):
+        """Write the journalled entries, in input order, to the with/without-code databases.
+
+        order is the list of (key, fingerprint) pairs of the input file; entries
+        no longer in the input are dropped and the newest record wins.
+        save(with_code, without_code) writes the two databases.
+        """
+        latest = {}
+        for record in self.records():
+            latest[(record['key'], record['hash'])] = record
+        with_code = empty_database(template)
+        without_code = empty_database(template)
+        for item in order:
+            record = latest.get(item)
+            if record is None:
+                continue
+            (with_code if record['has_code'] else without_code).entries.append(record['entry'])
+        save(with_code, without_code)
+        return len(with_code.entries), len(without_code.entries)
+
+    def compact_stream(self, order, write):
+        """Streaming compact: order may be any iterable of (key, fingerprint) pairs.
+
+        Nothing is held in memory; each record's offset is looked up in the
+        index, and the record read back from the journal, when its turn in
+        order comes, then passed to write(record). Call after close().
+        """
+        index = JsonlIndex(self.path, record_index_key)
+        counts = {True: 0, False: 0}
+        try:
+            with open(self.path, 'rb') as journal_file:
+                for key, fingerprint in order:
+                    offset = index.get(index_key(key, fingerprint))
+                    if offset is None:
+                        continue
+                    journal_file.seek(offset)
+                    record = json.loads(journal_file.readline())
+                    write(record)
+                    counts[bool(record['has_code'])] += 1
+        finally:
+            index.close()
+        return counts[True], counts[False]
+
+
+def empty_database(template):
+    """A database with the template's strings, preambles and comments but no entries."""
+    database = type(template)()
+    database.strings = dict(template.strings)
+    database.preambles = list(template.preambles)
+    database.comments = list(template.comments)
+    return database
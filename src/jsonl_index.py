@@ -0,0 +1,75 @@
+"""On-disk index of an append-only JSON-lines file, so that looking a record up never loads the whole file."""
+import json
+import os
+import sqlite3
+from threading import Lock
+
+
+class JsonlIndex:
+    """Maps a key of each record in a JSON-lines file to the byte offset of its newest record.
+
+    The index is an SQLite file next to the data (path + '.index') that also
+    remembers how many bytes of the data it covers. On open it indexes
+    whatever was appended since, and starts over if the data got shorter.
+    Offsets added since the last commit(size) are visible at once but only
+    become durable with it; call it once the data is written up to size.
+    """
+
+    def __init__(self, path, key_of):
+        self.path = path
+        self.key_of = key_of
+        self.lock = Lock()
+        self.conn = sqlite3.connect(path + '.index', timeout=60, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        # Lookups are by primary key; a small page cache keeps memory flat however big the index gets.
+        self.conn.execute('PRAGMA cache_size=-512')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS offsets (key TEXT PRIMARY KEY, offset INTEGER)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)')
+        self.conn.commit()
+        self.size = self._catch_up()
+
+    def _catch_up(self):
+        """Index the records appended since the last commit; return the size of the data now covered."""
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'size'").fetchone()
+        indexed = row[0] if row else 0
+        if indexed > size:
+            # The data was truncated or replaced: none of the old offsets can be trusted.
+            self.conn.execute('DELETE FROM offsets')
+            indexed = 0
+        if indexed < size:
+            with open(self.path, 'rb') as data_file:
+                data_file.seek(indexed)
+                for line in data_file:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        self.add(self.key_of(json.loads(line)), indexed)
+                    except (ValueError, KeyError, TypeError):
+                        pass
+                    indexed += len(line)
+        self.commit(indexed)
+        return indexed
+
+    def get(self, key):
+        """Byte offset of key's newest record, or None."""
+        with self.lock:
+            row = self.conn.execute('SELECT offset FROM offsets WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def add(self, key, offset):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO offsets VALUES (?, ?)', (key, offset))
+
+    def commit(self, size):
+        """Make the offsets added so far durable, recording that the data is indexed up to size bytes."""
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('size', ?)", (size,))
+            self.conn.commit()
+            self.size = size
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
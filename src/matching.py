@@ -0,0 +1,88 @@
+import re
+import zlib
+
+import numpy as np
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Token ids are 31-bit hashes rather than indices into a vocabulary, so nothing
+# grows with the number of distinct words seen. A title word falsely matching
+# one of a README's thousand-odd words is about a one in a million chance.
+ID_SPACE = 1 << 31
+
+# Words that carry no signal about which paper a README belongs to. Without
+# this list a title word like "a" matches almost any README.
+STOPWORDS = frozenset("""
+a an and are as at be by for from has in into is it its of on or that the their this to via we with
+using towards toward based new our over under through
+""".split())
+
+
+def normalize_title(title):
+    """Lowercase a title and reduce it to space-separated alphanumeric words, dropping BibTeX braces and punctuation."""
+    return ' '.join(TOKEN_RE.findall(title.lower().replace('{', '').replace('}', '')))
+
+
+def tokenize(text):
+    """Lowercase text and split it into alphanumeric tokens, dropping stopwords and single characters."""
+    return [token for token in TOKEN_RE.findall(text.lower()) if len(token) > 1 and token not in STOPWORDS]
+
+
+class TokenMatcher:
+    """Turns text into sorted arrays of token ids and scores titles against documents in batches.
+
+    The score is title coverage: the share of a title's distinct tokens that
+    occur anywhere in the document.
+    """
+
+    def encode(self, text):
+        """Return the distinct token ids of text as a sorted int32 array."""
+        tokens = set(tokenize(text))
+        ids = np.fromiter((zlib.crc32(token.encode('utf-8')) % ID_SPACE for token in tokens), dtype=np.int32, count=len(tokens))
+        # np.unique sorts, and drops the rare id two tokens hash to.
+        return np.unique(ids)
+
+    def coverage(self, titles, docs, pairs=None):
+        """Score encoded titles against encoded docs in one pass.
+
+        With pairs, an (n, 2) array of (title index, doc index), returns one
+        score per pair; without it, returns the full len(titles) x len(docs) matrix.
+        """
+        if pairs is None:
+            grid = np.indices((len(titles), len(docs))).reshape(2, -1).T
+            return self.coverage(titles, docs, grid).reshape(len(titles), len(docs))
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        if len(pairs) == 0:
+            return np.zeros(0, dtype=np.float32)
+        width = np.int64(ID_SPACE)
+
+        # Every doc's tokens once, as sorted (doc index, token id) keys.
+        doc_lengths = np.fromiter((len(doc) for doc in docs), dtype=np.int64, count=len(docs))
+        doc_keys = np.repeat(np.arange(len(docs), dtype=np.int64), doc_lengths) * width
+        if len(doc_keys):
+            doc_keys += np.concatenate(docs).astype(np.int64)
+
+        # Each pair's title tokens, keyed by the doc they are looked up in.
+        title_lengths = np.fromiter((len(titles[t]) for t in pairs[:, 0]), dtype=np.int64, count=len(pairs))
+        if not title_lengths.any():
+            return np.zeros(len(pairs), dtype=np.float32)
+        query_pair = np.repeat(np.arange(len(pairs)), title_lengths)
+        query_keys = np.repeat(pairs[:, 1], title_lengths) * width
+        query_keys += np.concatenate([titles[t] for t in pairs[:, 0]]).astype(np.int64)
+
+        positions = np.searchsorted(doc_keys, query_keys)
+        positions[positions == len(doc_keys)] = 0
+        found = doc_keys[positions] == query_keys if len(doc_keys) else np.zeros(len(query_keys), dtype=bool)
+        matched = np.bincount(query_pair, weights=found, minlength=len(pairs))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scores = np.where(title_lengths > 0, matched / title_lengths, 0.0)
+        return scores.astype(np.float32)
+
+    def coverage_one(self, title_ids, doc_ids):
+        """Score one encoded title against one encoded doc."""
+        if len(title_ids) == 0:
+            return 0.0
+        return float(np.isin(title_ids, doc_ids, assume_unique=True).mean())
+
+
+matcher = TokenMatcher()
@@ -0,0 +1,307 @@
+"""In-process counters, timers and lock-wait histograms, exported as JSON or a Prometheus textfile.
+
+Instrumented code uses the module-level registry:
+
+    with metrics.timer('stage_seconds', stage='pdf_parse'):
+        ...
+    metrics.count('platform_results_total', platform='zenodo', outcome='hit')
+
+and a MetricsExporter writes metrics.snapshot() to disk every few seconds and
+at exit. SamplingProfiler periodically samples the stacks of every thread.
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+# Upper bounds, in seconds, of the histogram buckets; the last bucket is +Inf.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+PROMETHEUS_PREFIX = 'codebase_finder_'
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile; max for the overflow bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Metrics:
+    """Thread-safe registry of labelled counters and histograms."""
+
+    def __init__(self):
+        self.counters = Counter()
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def count(self, name, value=1, **labels):
+        with self.lock:
+            self.counters[_key(name, labels)] += value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the duration of the with-block, whether or not it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, name, outcomes=None, **labels):
+        """Decorator: time every call under name and, if outcomes is given, count hits, misses and errors.
+
+        A truthy return value is a hit, a falsy one a miss; exceptions are
+        counted as errors and re-raised.
+        """
+        def decorate(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                outcome = 'error'
+                try:
+                    result = func(*args, **kwargs)
+                    outcome = 'hit' if result else 'miss'
+                    return result
+                finally:
+                    self.observe(name, time.perf_counter() - started, **labels)
+                    if outcomes:
+                        self.count(outcomes, outcome=outcome, **labels)
+            return wrapper
+        return decorate
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        """Everything recorded so far, as plain JSON-serializable data."""
+        with self.lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = [{'name': name, 'labels': dict(labels), 'count': h.count, 'sum': round(h.sum, 6),
+                           'max': round(h.max, 6), 'p50': h.quantile(0.5), 'p99': h.quantile(0.99),
+                           'buckets': dict(zip([str(bound) for bound in BUCKETS] + ['+Inf'], h.buckets))}
+                          for (name, labels), h in sorted(self.histograms.items())]
+        return {'started': self.started, 'time': time.time(), 'counters': counters, 'histograms': histograms}
+
+
+def _prometheus_labels(labels, extra=None):
+    items = list(labels.items()) + list((extra or {}).items())
+    if not items:
+        return ''
+    escaped = ('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in items)
+    return '{' + ','.join(escaped) + '}'
+
+
+def to_prometheus(snapshot):
+    """Render a snapshot in the Prometheus text exposition format, for node_exporter's textfile collector."""
+    lines = []
+    typed = set()
+    for counter in snapshot['counters']:
+        name = PROMETHEUS_PREFIX + counter['name']
+        if name not in typed:
+            lines.append(f'# TYPE {name} counter')
+            typed.add(name)
+        lines.append(f"{name}{_prometheus_labels(counter['labels'])} {counter['value']}")
+    for histogram in snapshot['histograms']:
+        name = PROMETHEUS_PREFIX + histogram['name']
+        if name not in typed:
+            lines.append(f'# TYPE {name} histogram')
+            typed.add(name)
+        cumulative = 0
+        for bound, count in histogram['buckets'].items():
+            cumulative += count
+            lines.append(f"{name}_bucket{_prometheus_labels(histogram['labels'], {'le': bound})} {cumulative}")
+        lines.append(f"{name}_sum{_prometheus_labels(histogram['labels'])} {histogram['sum']}")
+        lines.append(f"{name}_count{_prometheus_labels(histogram['labels'])} {histogram['count']}")
+    return '\n'.join(lines) + '\n'
+
+
+class TimedLock:
+    """A Lock that records how long each acquire waited, as lock_wait_seconds{lock=name}."""
+
+    def __init__(self, name, registry=None):
+        self.name = name
+        self.registry = registry
+        self._lock = threading.Lock()
+
+    def acquire(self, blocking=True, timeout=-1):
+        started = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        (self.registry or metrics).observe('lock_wait_seconds', time.perf_counter() - started, lock=self.name)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class MetricsExporter:
+    """Writes the registry to path every interval seconds and once more on close.
+
+    A path ending in .prom gets the Prometheus text format, anything else JSON.
+    Files are replaced atomically so readers never see a partial write.
+    """
+
+    def __init__(self, path, interval=30.0, registry=None):
+        self.path = path
+        self.interval = interval
+        self.registry = registry or metrics
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='metrics-exporter', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        snapshot = self.registry.snapshot()
+        text = to_prometheus(snapshot) if self.path.endswith('.prom') else json.dumps(snapshot, indent=2)
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as metrics_file:
+            metrics_file.write(text)
+        os.replace(self.path + '.tmp', self.path)
+
+    def close(self):
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        self.write()
+
+
+class SamplingProfiler:
+    """Samples the stack of every other thread every interval seconds.
+
+    Counts, per function, how often it was running (self) and how often it was
+    anywhere on the stack (total). Waiting counts too, so a thread blocked on
+    a socket shows up in the socket code - this is a wall-clock profile.
+    Worker processes (PDF parsing) are not sampled.
+    """
+
+    def __init__(self, path, interval=0.005):
+        self.path = path
+        self.interval = interval
+        self.samples = 0
+        self.self_counts = Counter()
+        self.total_counts = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                self.samples += 1
+                seen = set()
+                top = True
+                while frame is not None:
+                    code = frame.f_code
+                    where = (code.co_filename, code.co_firstlineno, code.co_name)
+                    if top:
+                        self.self_counts[where] += 1
+                        top = False
+                    if where not in seen:
+                        self.total_counts[where] += 1
+                        seen.add(where)
+                    frame = frame.f_back
+
+    def report(self, top=40):
+        def table(counts, title):
+            lines = [title, f"{'samples':>9}{'share':>8}  function"]
+            for (filename, line, name), count in counts.most_common(top):
+                lines.append(f"{count:>9}{count / max(1, self.samples):>8.1%}  {name} ({filename}:{line})")
+            return lines
+        header = [f'{self.samples} thread samples every {self.interval * 1000:.0f}ms', '']
+        return '\n'.join(header + table(self.self_counts, 'Self (running in the function itself)') + ['']
+                         + table(self.total_counts, 'Total (function anywhere on the stack)')) + '\n'
+
+    def close(self):
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        self.thread.join()
+        with open(self.path, 'w', encoding='utf-8') as profile_file:
+            profile_file.write(self.report())
+
+
+metrics = Metrics()
+
+
+def start_metrics_export(path, interval=30.0):
+    """Export the registry to path periodically and at interpreter exit."""
+    exporter = MetricsExporter(path, interval).start()
+    atexit.register(exporter.close)
+    return exporter
+
+
+def start_profiler(path, interval=0.005):
+    """Sample all threads until exit, then write the hottest functions to path."""
+    profiler = SamplingProfiler(path, interval).start()
+    atexit.register(profiler.close)
+    return profiler
+
+
+def record_backoff(details):
+    """on_backoff handler for the backoff decorators: count the retry under the retried function's name."""
+    metrics.count('retries_total', function=details['target'].__name__)
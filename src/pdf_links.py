@@ -0,0 +1,151 @@
+import multiprocessing
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from threading import Lock
+
+from PyPDF2 import PdfReader
+
+LINK_RE = re.compile(r'(https?://\S+)')
+CODE_HOST_RE = re.compile(
+    r'https?://(?:www\.)?(?:github\.com|gitlab\.com|bitbucket\.org|huggingface\.co|zenodo\.org|'
+    r'codeocean\.com|figshare\.com|data\.mendeley\.com|sourceforge\.net)/\S+', re.IGNORECASE)
+
+DEFAULT_MAX_BYTES = 64 * 1024 ** 2  # Give up on PDFs bigger than this
+SPOOL_BYTES = 2 * 1024 ** 2  # Keep PDFs up to this size in memory, spill larger ones to disk
+CHUNK_BYTES = 64 * 1024
+
+
+class PdfTooLarge(Exception):
+    """The PDF is bigger than the configured cap."""
+
+
+def spool_pdf(response, max_bytes=DEFAULT_MAX_BYTES, spool_bytes=SPOOL_BYTES):
+    """Stream a PDF response into memory, or into a temp file once it passes spool_bytes.
+
+    Returns the bytes or the temp file path; release_pdf removes the file.
+    Memory use is bounded by spool_bytes whatever the size of the PDF.
+    """
+    length = response.headers.get('Content-Length')
+    if length and length.isdigit() and int(length) > max_bytes:
+        response.close()
+        raise PdfTooLarge(f"PDF at '{response.url}' is {int(length)} bytes")
+    buffer = bytearray()
+    spill = None
+    total = 0
+    try:
+        for chunk in response.iter_content(CHUNK_BYTES):
+            total += len(chunk)
+            if total > max_bytes:
+                raise PdfTooLarge(f"PDF at '{response.url}' is over {max_bytes} bytes")
+            if spill is None and total > spool_bytes:
+                spill = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+                spill.write(buffer)
+                buffer = None
+            if spill is None:
+                buffer += chunk
+            else:
+                spill.write(chunk)
+    except BaseException:
+        if spill is not None:
+            spill.close()
+            os.unlink(spill.name)
+        raise
+    finally:
+        response.close()
+    if spill is None:
+        return bytes(buffer)
+    spill.close()
+    return spill.name
+
+
+def release_pdf(pdf_source):
+    """Remove the temp file behind a spooled PDF, if there is one."""
+    if isinstance(pdf_source, str) and os.path.exists(pdf_source):
+        os.unlink(pdf_source)
+
+
+def annotation_links(page):
+    """URIs of the clickable link annotations on a page - no text extraction needed."""
+    if '/Annots' not in page:
+        return []
+    links = []
+    # /Annots and each annotation may be indirect references.
+    for annotation in page['/Annots'].get_object() or []:
+        action = annotation.get_object().get('/A')
+        uri = action.get_object().get('/URI') if action is not None else None
+        if uri:
+            links.append(str(uri))
+    return links
+
+
+def extract_code_links(pdf_source):
+    """Collect links page by page, stopping at the first page that has a code-host link.
+
+    Each page's link annotations are read first; its text is only extracted
+    when they contain no code-host link. Code-host links come first in the
+    result. Runs in a worker process.
+    """
+    reader = PdfReader(BytesIO(pdf_source) if isinstance(pdf_source, bytes) else pdf_source)
+    links = []
+    for page in reader.pages:
+        try:
+            page_links = annotation_links(page)
+        except Exception:
+            # A malformed annotation must not cost the whole paper; the page text is read below.
+            page_links = []
+        if not any(CODE_HOST_RE.match(link) for link in page_links):
+            page_links += LINK_RE.findall(page.extract_text() or '')
+        for link in page_links:
+            if link not in links:
+                links.append(link)
+        if any(CODE_HOST_RE.match(link) for link in page_links):
+            break
+    return sorted(links, key=lambda link: not CODE_HOST_RE.match(link))
+
+
+_pool = None
+_pool_workers = max(1, min(4, os.cpu_count() or 1))
+_pool_lock = Lock()
+
+
+def configure_pdf_pool(workers):
+    """Set the number of worker processes used for PDF parsing (0 parses in the calling thread)."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        _pool_workers = workers
+
+
+def _get_pool(broken=None):
+    """The shared process pool, replacing it first if it is broken."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool is broken:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            # spawn, not fork: forking a process full of I/O threads can deadlock the child.
+            _pool = ProcessPoolExecutor(max_workers=_pool_workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def parse_pdf_links(pdf_source):
+    """Run extract_code_links in the process pool so PDF parsing does not hold the GIL of the I/O threads.
+
+    A worker that dies, say killed for memory on a bad PDF, breaks the whole
+    pool; it is replaced and the PDF tried once more, so one bad paper does
+    not cost every later one.
+    """
+    if _pool_workers <= 0:
+        return extract_code_links(pdf_source)
+    pool = _get_pool()
+    try:
+        return pool.submit(extract_code_links, pdf_source).result()
+    except BrokenProcessPool:
+        return _get_pool(broken=pool).submit(extract_code_links, pdf_source).result()
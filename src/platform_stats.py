@@ -0,0 +1,215 @@
+"""Per-platform hit rates, latencies and errors, kept across runs.
+
+They decide which platform searches start first, by expected cost per hit,
+when only a few run at once, and drive a circuit breaker per platform: after a streak of failed searches the
+platform is skipped for a cool-down, then tried once before it is let back in.
+"""
+import contextvars
+import json
+import os
+import time
+from collections import Counter
+
+from metrics import TimedLock, metrics
+from rate_limit import RateLimited
+from transport import RequestCancelled, cancel_scope, request_tally
+
+STATS_NAME = 'platform_stats.json'
+# Once a platform has more calls than this on record, older ones are scaled
+# down on load so that recent runs dominate.
+HISTORY_CALLS = 2000
+# How many past runs the stats file keeps for the report.
+HISTORY_RUNS = 20
+BREAKER_ERRORS = 5
+BREAKER_COOLDOWN = 120.0
+FIELDS = ('calls', 'hits', 'errors', 'seconds', 'requests')
+
+# Exceptions the platform search running in the current context swallowed.
+_call_errors = contextvars.ContextVar('platform_call_errors', default=None)
+
+
+def platform_name(func):
+    return func.__name__.replace('search_', '', 1)
+
+
+def cancelled(e=None):
+    """True if e is a RequestCancelled or the search running in this context was cancelled, e.g. by first_hit."""
+    event = cancel_scope.get()
+    return isinstance(e, RequestCancelled) or (event is not None and event.is_set())
+
+
+def note_error(e):
+    """Count e against the platform search running in this context, which caught it; cancellations are not errors."""
+    errors = _call_errors.get()
+    if errors is not None and not cancelled(e):
+        errors.append(e)
+
+
+def _empty():
+    return dict.fromkeys(FIELDS, 0)
+
+
+class PlatformStats:
+    """Outcomes of every platform search, this run's and the ones loaded from path."""
+
+    def __init__(self, path=None, breaker_errors=BREAKER_ERRORS, breaker_cooldown=BREAKER_COOLDOWN, adaptive=True):
+        self.path = path
+        self.adaptive = adaptive
+        self.breaker_errors = breaker_errors
+        self.breaker_cooldown = breaker_cooldown
+        self.history = {}
+        self.runs = []
+        self.current = {}
+        self.skipped = Counter()
+        self.streaks = Counter()
+        self.open_until = {}
+        self.lock = TimedLock('platform_stats')
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as stats_file:
+                saved = json.load(stats_file)
+            self.runs = saved.get('runs', [])
+            for name, stat in saved.get('platforms', {}).items():
+                scale = min(1.0, HISTORY_CALLS / stat['calls']) if stat['calls'] else 1.0
+                self.history[name] = {field: stat.get(field, 0) * scale for field in FIELDS}
+
+    def expected_cost(self, name):
+        """Seconds spent per codebase found on name, judged by past runs only.
+
+        Both rates start from a prior of one hit in two calls taking a second
+        each, so platforms with little history are neither favoured nor buried.
+        """
+        stat = self.history.get(name, _empty())
+        mean_seconds = (stat['seconds'] + 1.0) / (stat['calls'] + 1)
+        hit_rate = (stat['hits'] + 1.0) / (stat['calls'] + 2)
+        return mean_seconds / hit_rate
+
+    def order(self, platforms):
+        """platforms sorted by expected cost per hit, ties keeping their given order; as given unless adaptive."""
+        if not self.adaptive:
+            return list(platforms)
+        return sorted(platforms, key=lambda func: self.expected_cost(platform_name(func)))
+
+    def allow(self, name):
+        """False while name's breaker is open; once the cool-down is over, let one trial call through."""
+        with self.lock:
+            until = self.open_until.get(name)
+            if until is None:
+                return True
+            now = time.monotonic()
+            if now < until:
+                self.skipped[name] += 1
+                return False
+            # Half-open: keep the breaker shut for everyone else until the trial call reports back.
+            self.open_until[name] = now + self.breaker_cooldown
+            return True
+
+    def record(self, name, seconds, hit, error, requests):
+        with self.lock:
+            stat = self.current.setdefault(name, _empty())
+            stat['calls'] += 1
+            stat['hits'] += bool(hit)
+            stat['errors'] += bool(error)
+            stat['seconds'] += seconds
+            stat['requests'] += requests
+            if not error:
+                self.streaks[name] = 0
+                self.open_until.pop(name, None)
+                return
+            self.streaks[name] += 1
+            if self.breaker_errors and self.streaks[name] >= self.breaker_errors:
+                if name not in self.open_until:
+                    metrics.count('circuit_breaker_trips_total', platform=name)
+                    print(f"Skipping {name} for {self.breaker_cooldown:.0f}s after {self.streaks[name]} failed searches in a row")
+                self.open_until[name] = time.monotonic() + self.breaker_cooldown
+
+    def call(self, func, *args):
+        """Run the platform search func(*args), recording its outcome; None at once while its breaker is open.
+
+        Calls cancelled because a higher-priority platform already hit, and
+        calls handed back as RateLimited, say nothing about the platform and
+        are not recorded.
+        """
+        name = platform_name(func)
+        if not self.allow(name):
+            metrics.count('platform_skipped_total', platform=name)
+            return None
+        errors, tally = [], Counter()
+        errors_token, tally_token = _call_errors.set(errors), request_tally.set(tally)
+        started = time.perf_counter()
+        result = None
+        throttled = False
+        try:
+            result = func(*args)
+            return result
+        except RateLimited:
+            throttled = True
+            raise
+        except Exception as e:
+            note_error(e)
+            raise
+        finally:
+            _call_errors.reset(errors_token)
+            request_tally.reset(tally_token)
+            if not throttled and not cancelled():
+                self.record(name, time.perf_counter() - started, result, errors, sum(tally.values()))
+
+    def summary(self, order):
+        """This run in one record: platform order used, calls, hits, requests and skipped calls."""
+        with self.lock:
+            totals = _empty()
+            for stat in self.current.values():
+                for field in FIELDS:
+                    totals[field] += stat[field]
+            return {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'mode': 'adaptive' if self.adaptive else 'fixed',
+                    'order': order, 'skipped': sum(self.skipped.values()),
+                    **{field: round(value, 3) for field, value in totals.items()}}
+
+    def save(self, order):
+        """Add this run to the stats file and start counting afresh."""
+        if not self.path or not (self.current or self.skipped):
+            return
+        run = self.summary(order)
+        with self.lock:
+            platforms = {}
+            for name in set(self.history) | set(self.current):
+                past, now = self.history.get(name, _empty()), self.current.get(name, _empty())
+                platforms[name] = {field: round(past[field] + now[field], 3) for field in FIELDS}
+            self.runs = (self.runs + [run])[-HISTORY_RUNS:]
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as stats_file:
+                json.dump({'platforms': platforms, 'runs': self.runs}, stats_file, indent=2)
+            os.replace(self.path + '.tmp', self.path)
+            self.history = platforms
+            self.current = {}
+            self.skipped.clear()
+
+    def report(self, order):
+        """This run's platform table and the requests per found codebase of recent runs."""
+        with self.lock:
+            lines = [f"{'platform':<16}{'cost/hit':>9}{'calls':>7}{'hits':>6}{'errors':>8}{'skipped':>9}{'mean s':>8}{'req/call':>10}"]
+            for name in order:
+                stat = self.current.get(name, _empty())
+                calls = max(1, stat['calls'])
+                lines.append(f"{name:<16}{self.expected_cost(name):>9.2f}{stat['calls']:>7}{stat['hits']:>6}{stat['errors']:>8}"
+                             f"{self.skipped[name]:>9}{stat['seconds'] / calls:>8.2f}{stat['requests'] / calls:>10.2f}")
+        runs = self.runs + ([self.summary(order)] if self.current else [])
+        lines += ['', f"{'run':<21}{'order':<10}{'requests':>9}{'hits':>6}{'req/hit':>9}{'skipped':>9}"]
+        for run in runs[-10:]:
+            per_hit = f"{run['requests'] / run['hits']:.2f}" if run['hits'] else '-'
+            lines.append(f"{run['time']:<21}{run['mode']:<10}{run['requests']:>9}{run['hits']:>6}{per_hit:>9}{run['skipped']:>9}")
+        return '\n'.join(lines)
+
+
+_stats = PlatformStats()
+
+
+def configure_platform_stats(output_dir=None, path=None, breaker_errors=BREAKER_ERRORS, breaker_cooldown=BREAKER_COOLDOWN, adaptive=True):
+    """Replace the process-wide stats; they are kept in output_dir unless path is given."""
+    global _stats
+    if path is None and output_dir:
+        path = os.path.join(output_dir, STATS_NAME)
+    _stats = PlatformStats(path, breaker_errors, breaker_cooldown, adaptive)
+    return _stats
+
+
+def get_platform_stats():
+    return _stats
@@ -0,0 +1,158 @@
+"""Offline lookup of paper -> code links from the PapersWithCode links dump.
+
+Build the index once from a local copy of links-between-papers-and-code.json.gz:
+
+    python src/pwc_index.py --links links-between-papers-and-code.json.gz --out pwc_index.bin
+
+then pass --pwc_index pwc_index.bin to scrape_codebases_parallel.py.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import struct
+
+import numpy as np
+
+from matching import normalize_title
+
+MAGIC = b'PWCIDX01'
+HEADER = struct.Struct('<8sQ')  # magic, number of keys
+# After the header: count sorted key hashes, then count (offset, length) pairs
+# locating each URL in the string blob that fills the rest of the file. Hashes
+# are stored on their own so the binary search runs over one contiguous array.
+HASH = np.dtype('<u8')
+LOCATION = np.dtype([('offset', '<u4'), ('length', '<u4')])
+
+ARXIV_NEW_RE = re.compile(r'(\d{4}\.\d{4,5})(?:v\d+)?')
+ARXIV_OLD_RE = re.compile(r'([a-z\-]+(?:\.[a-z]{2})?/\d{7})(?:v\d+)?', re.IGNORECASE)
+ARXIV_DOI_PREFIX = '10.48550/arxiv.'
+
+
+def key_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def find_arxiv_id(text):
+    """Pull an arXiv id (without version) out of a DOI, URL, eprint or journal field."""
+    if not text:
+        return None
+    match = ARXIV_NEW_RE.search(text) or ARXIV_OLD_RE.search(text)
+    return match.group(1).lower() if match else None
+
+
+def lookup_keys(doi=None, arxiv_id=None, title=None):
+    """Index keys for a paper, most specific first."""
+    keys = []
+    if doi:
+        keys.append('doi:' + doi.strip().lower())
+    if arxiv_id:
+        keys.append('arxiv:' + arxiv_id)
+        keys.append('doi:' + ARXIV_DOI_PREFIX + arxiv_id)
+    if title:
+        normalized = normalize_title(title)
+        if normalized:
+            keys.append('title:' + normalized)
+    return keys
+
+
+def entry_keys(entry):
+    """Index keys for a BibTeX entry."""
+    doi = entry.get('doi', '')
+    arxiv_id = None
+    if doi.lower().startswith(ARXIV_DOI_PREFIX):
+        arxiv_id = find_arxiv_id(doi)
+    for field in ('eprint', 'url', 'journal'):
+        if arxiv_id:
+            break
+        value = entry.get(field, '')
+        if field != 'eprint' and 'arxiv' not in value.lower():
+            continue
+        arxiv_id = find_arxiv_id(value)
+    return lookup_keys(doi, arxiv_id, entry.get('title', ''))
+
+
+def link_rank(link):
+    """Official repositories first, then ones the paper itself mentions."""
+    return (bool(link.get('is_official')), bool(link.get('mentioned_in_paper')))
+
+
+def build_index(links_path, index_path):
+    """Turn the links dump into a sorted, memory-mappable hash table of key -> repository URL."""
+    opener = gzip.open if links_path.endswith('.gz') else open
+    with opener(links_path, 'rt', encoding='utf-8') as links_file:
+        links = json.load(links_file)
+
+    best = {}
+    for link in links:
+        repo_url = link.get('repo_url')
+        if not repo_url:
+            continue
+        arxiv_id = link.get('paper_arxiv_id') or find_arxiv_id(link.get('paper_url_abs', ''))
+        for key in lookup_keys(link.get('doi'), arxiv_id and arxiv_id.lower(), link.get('paper_title')):
+            current = best.get(key)
+            if current is None or link_rank(link) > link_rank(current):
+                best[key] = link
+
+    blob = bytearray()
+    offsets = {}
+    hashes = np.zeros(len(best), dtype=HASH)
+    locations = np.zeros(len(best), dtype=LOCATION)
+    for i, (key, link) in enumerate(best.items()):
+        url = link['repo_url'].encode('utf-8')
+        if url not in offsets:
+            offsets[url] = len(blob)
+            blob += url
+        hashes[i] = key_hash(key)
+        locations[i] = (offsets[url], len(url))
+    order = np.argsort(hashes, kind='stable')
+
+    with open(index_path, 'wb') as index_file:
+        index_file.write(HEADER.pack(MAGIC, len(best)))
+        index_file.write(hashes[order].tobytes())
+        index_file.write(locations[order].tobytes())
+        index_file.write(blob)
+    return len(best)
+
+
+class PwCIndex:
+    """Read-only view of an index built by build_index, memory-mapped so lookups barely touch RAM."""
+
+    def __init__(self, index_path):
+        with open(index_path, 'rb') as index_file:
+            magic, count = HEADER.unpack(index_file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"'{index_path}' is not a PapersWithCode index")
+        if count == 0:
+            self.hashes = np.zeros(0, dtype=HASH)
+            return
+        offset = HEADER.size
+        self.hashes = np.memmap(index_path, dtype=HASH, mode='r', offset=offset, shape=(count,))
+        offset += count * HASH.itemsize
+        self.locations = np.memmap(index_path, dtype=LOCATION, mode='r', offset=offset, shape=(count,))
+        offset += count * LOCATION.itemsize
+        self.blob = np.memmap(index_path, dtype=np.uint8, mode='r', offset=offset)
+
+    def lookup(self, keys):
+        """Return the repository URL for the first key that is in the index, or None."""
+        hashes = self.hashes
+        for key in keys:
+            h = np.uint64(key_hash(key))
+            position = int(np.searchsorted(hashes, h))
+            if position < len(hashes) and hashes[position] == h:
+                start, length = (int(value) for value in self.locations[position])
+                return bytes(self.blob[start:start + length]).decode('utf-8')
+        return None
+
+    def lookup_entry(self, entry):
+        return self.lookup(entry_keys(entry))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build an offline PapersWithCode paper-to-code index.')
+    parser.add_argument('--links', required=True, help='Path to links-between-papers-and-code.json(.gz)')
+    parser.add_argument('--out', required=True, help='Path of the index file to write')
+    args = parser.parse_args()
+    count = build_index(args.links, args.out)
+    print(f"Wrote {count} keys to {args.out}")
@@ -0,0 +1,323 @@
+import contextvars
+import fcntl
+import json
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from threading import Lock
+
+from metrics import metrics
+
+# Sustained requests per second and burst size for each source. GitHub's
+# search API allows 30 requests a minute with a token; the scraped sites get a
+# polite one or two requests a second. 'web' is the limit of each 'web:<host>'
+# source, one per host that is not one of the platforms.
+DEFAULT_LIMITS = {
+    'default': (5.0, 10),
+    'github': (0.5, 5),
+    'github_graphql': (1.0, 5),
+    'github_html': (1.0, 5),
+    'paperswithcode': (1.0, 5),
+    'huggingface': (2.0, 5),
+    'zenodo': (1.0, 5),
+    'figshare': (1.0, 5),
+    'openreview': (1.0, 5),
+    'codeocean': (1.0, 5),
+    'mendeley': (1.0, 5),
+    'doi': (10.0, 20),
+    'crossref': (10.0, 20),
+    'pdf': (5.0, 10),
+    'web': (1.0, 5),
+}
+
+# A thread waits in place for a token only this long; past it the request is
+# handed back to the engine as RateLimited so the thread can do other work.
+MAX_BLOCK = 1.0
+
+# Back-off used when a server says 429 without telling us for how long.
+DEFAULT_RETRY_AFTER = 30.0
+
+# Sources whose quota belongs to the API token rather than to the machine, and
+# so is shared by every process using a --rate_budget_file.
+SHARED_SOURCES = ('github', 'github_graphql')
+
+# The Reservations of the throttled call running in this context; see with_reservations.
+_reservations = contextvars.ContextVar('rate_limit_reservations', default=None)
+
+
+class RateLimited(Exception):
+    """A source is out of budget; the request should be retried after retry_after seconds."""
+
+    def __init__(self, source, retry_after):
+        super().__init__(f"'{source}' is rate limited for another {retry_after:.1f}s")
+        self.source = source
+        self.retry_after = retry_after
+
+
+def source_setting(settings, source):
+    """settings[source]; for 'kind:name' sources, settings[kind] unless that one is set; else settings['default']."""
+    if source in settings:
+        return settings[source]
+    return settings.get(source.partition(':')[0], settings['default'])
+
+
+def parse_retry_after(value):
+    """Retry-After is either a number of seconds or an HTTP date."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class Reservations:
+    """The slots booked by one call's RateLimited requests, as {source: start time on the bucket's clock}.
+
+    sent says whether the call has sent a request yet: one that has would
+    repeat it if handed back, so it waits for its slot in place instead.
+    """
+
+    def __init__(self):
+        self.slots = {}
+        self.sent = False
+
+
+class TokenBucket:
+    """Refills at rate tokens per second up to capacity; tokens go negative as requests queue up."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def give_back(self, now):
+        """Return a token taken for a request that was never sent."""
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def block_for(self, seconds, now):
+        """Hold all requests for seconds, as a server told us to."""
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = min(self.tokens, 0.0)
+
+
+class SharedBudget:
+    """Token buckets kept in a JSON file, so that several processes - shards on other nodes - draw on one budget.
+
+    Each use locks the file with fcntl.lockf, which also works across NFS
+    clients with lockd. Bucket times are wall-clock seconds, since monotonic
+    clocks are not comparable between machines. POSIX locks do not exclude
+    threads of the same process; callers serialize those themselves.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @contextmanager
+    def bucket(self, source, rate, capacity):
+        """Lock the file and yield source's bucket; its state is written back when the block ends."""
+        with open(self.path, 'a+', encoding='utf-8') as budget_file:
+            fcntl.lockf(budget_file, fcntl.LOCK_EX)
+            try:
+                budget_file.seek(0)
+                text = budget_file.read()
+                state = json.loads(text) if text.strip() else {}
+                bucket = TokenBucket(rate, capacity)
+                if source in state:
+                    bucket.tokens, bucket.updated, bucket.blocked_until = state[source]
+                else:
+                    bucket.updated = time.time()
+                yield bucket
+                state[source] = [bucket.tokens, bucket.updated, bucket.blocked_until]
+                budget_file.seek(0)
+                budget_file.truncate()
+                budget_file.write(json.dumps(state))
+                budget_file.flush()
+            finally:
+                fcntl.lockf(budget_file, fcntl.LOCK_UN)
+
+
+class RateLimitScheduler:
+    """One token bucket per source, kept in step with the rate-limit headers servers send back.
+
+    With a SharedBudget, the buckets of shared_sources live in its file instead
+    of in this process.
+    """
+
+    def __init__(self, limits=None, budget=None, shared_sources=SHARED_SOURCES):
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.budget = budget
+        self.shared_sources = set(shared_sources)
+        self.buckets = {}
+        self.lock = Lock()
+        self.stats = {}
+
+    def _limit(self, source):
+        return source_setting(self.limits, source)
+
+    def _bucket(self, source):
+        if source not in self.buckets:
+            self.buckets[source] = TokenBucket(*self._limit(source))
+        return self.buckets[source]
+
+    @contextmanager
+    def _bucket_now(self, source):
+        """Yield source's bucket and the current time on its clock; call with the lock held."""
+        if self.budget is not None and source in self.shared_sources:
+            with self.budget.bucket(source, *self._limit(source)) as bucket:
+                yield bucket, time.time()
+        else:
+            yield self._bucket(source), time.monotonic()
+
+    def _stat(self, source):
+        return self.stats.setdefault(source, {'requests': 0, 'throttled': 0, 'blocked_seconds': 0.0,
+                                               'queued': 0, 'queued_seconds': 0.0})
+
+    def acquire(self, source, max_block=MAX_BLOCK):
+        """Take a token, sleeping for short waits and raising RateLimited for long ones.
+
+        Inside with_reservations, a long wait still takes the token - the
+        bucket goes negative - and books its start time, so that the retried
+        call goes in its turn rather than racing every other parked call for
+        the next token. A call that has already sent a request sleeps until
+        its slot instead, unless the server itself asked us to back off.
+        """
+        reserved = _reservations.get()
+        with self.lock, self._bucket_now(source) as (bucket, now):
+            held = reserved is not None and source in reserved.slots
+            if held:
+                wait = max(0.0, reserved.slots.pop(source) - now, bucket.blocked_until - now)
+            else:
+                wait = bucket.wait_time(now)
+            stat = self._stat(source)
+            park = wait > max_block and (reserved is None or not reserved.sent or bucket.blocked_until > now)
+            if park:
+                stat['throttled'] += 1
+                metrics.count('rate_limited_total', source=source)
+                if reserved is not None:
+                    if not held:
+                        bucket.take(now)
+                    reserved.slots[source] = now + wait
+                raise RateLimited(source, wait)
+            if not held:
+                bucket.take(now)
+            stat['requests'] += 1
+            if wait > 0:
+                stat['blocked_seconds'] += wait
+        if reserved is not None:
+            reserved.sent = True
+        if wait > 0:
+            metrics.observe('rate_limit_wait_seconds', wait, source=source)
+            time.sleep(wait)
+
+    def update_from_headers(self, source, status, headers):
+        """Apply X-RateLimit-Remaining/Reset and Retry-After; return the back-off they imply, if any."""
+        backoff = None
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        if remaining is not None and reset is not None:
+            try:
+                if int(remaining) <= 0:
+                    backoff = max(0.0, float(reset) - time.time())
+            except ValueError:
+                pass
+        if status == 429 or (status in (403, 503) and ('Retry-After' in headers or backoff is not None)):
+            retry_after = parse_retry_after(headers.get('Retry-After'))
+            if retry_after is None and backoff is None:
+                retry_after = DEFAULT_RETRY_AFTER
+            backoff = max(backoff or 0.0, retry_after or 0.0)
+        if backoff is not None:
+            metrics.count('rate_limit_backoffs_total', source=source, status=status)
+            with self.lock, self._bucket_now(source) as (bucket, now):
+                bucket.block_for(backoff, now)
+        return backoff
+
+    def release(self, reserved):
+        """Hand back the tokens of the slots booked in reserved, a Reservations, that will not be used."""
+        for source in list(reserved.slots):
+            with self.lock, self._bucket_now(source) as (bucket, now):
+                bucket.give_back(now)
+            del reserved.slots[source]
+
+    def record_queued(self, source, seconds):
+        """Count time a request spent parked in the engine's queue instead of on a thread."""
+        metrics.observe('rate_limit_queued_seconds', seconds, source=source)
+        with self.lock:
+            stat = self._stat(source)
+            stat['queued'] += 1
+            stat['queued_seconds'] += seconds
+
+    def report(self):
+        with self.lock:
+            return {source: dict(stat) for source, stat in self.stats.items()}
+
+
+def with_reservations(reserved, func, *args):
+    """Call func(*args), booking the slots of its RateLimited requests in reserved, a Reservations, and using those booked before."""
+    token = _reservations.set(reserved)
+    try:
+        return func(*args)
+    finally:
+        _reservations.reset(token)
+
+
+def wait_out_rate_limits(func, *args, max_retries=5, max_wait=300.0):
+    """Call func, sleeping through RateLimited back-offs in the calling thread.
+
+    For code that runs outside the async engine, which parks such calls on
+    the event loop instead.
+    """
+    reserved = Reservations()
+    try:
+        for attempt in range(max_retries + 1):
+            try:
+                return with_reservations(reserved, func, *args)
+            except RateLimited as e:
+                if attempt == max_retries or e.retry_after > max_wait:
+                    raise
+                get_rate_limiter().record_queued(e.source, e.retry_after)
+                time.sleep(e.retry_after)
+    finally:
+        get_rate_limiter().release(reserved)
+
+
+def parse_limits(text):
+    """Parse 'github=0.5,doi=10' or 'github=0.5:3' (rate[:burst]) into a limits dict."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in (text or '').split(','))):
+        source, _, value = item.partition('=')
+        rate, _, burst = value.partition(':')
+        limits[source.strip()] = (float(rate), int(burst) if burst else max(1, int(float(rate) * 2)))
+    return limits
+
+
+_scheduler = RateLimitScheduler()
+
+
+def configure_rate_limits(limits=None, budget_path=None, shared_sources=SHARED_SOURCES):
+    """Replace the process-wide scheduler; with budget_path, shared_sources draw on that file's budget."""
+    global _scheduler
+    _scheduler = RateLimitScheduler(limits, SharedBudget(budget_path) if budget_path else None, shared_sources)
+    return _scheduler
+
+
+def get_rate_limiter():
+    return _scheduler
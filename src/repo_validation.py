@@ -0,0 +1,123 @@
+from collections import namedtuple
+from concurrent.futures import Future
+from urllib.parse import urlsplit, urlunsplit
+
+from metrics import TimedLock, metrics
+from transport import RequestCancelled
+
+# What validation needs from a repository page. readme_tokens holds the README's
+# token ids (see matching.py) or None when the page has no README; authors are
+# the commit author names shown on the page.
+RepoPage = namedtuple('RepoPage', ['url', 'status', 'readme_tokens', 'authors'])
+
+# Hosts whose repository root is /<owner>/<name>; anything below that is a view of the same repo.
+CODE_HOSTS = ('github.com', 'gitlab.com', 'bitbucket.org')
+
+
+def clean_candidate_url(url):
+    """The candidate URL as it should be fetched: with a scheme, without punctuation stuck to links pulled out of PDF text."""
+    url = url.strip().rstrip('.,;:)]}>\'"')
+    if '://' not in url:
+        url = 'https://' + url
+    return url
+
+
+def normalize_repo_url(url):
+    """Canonical form of a candidate URL so that variants of one repository share a single fetch.
+
+    Drops fragments, query strings, trailing slashes, a trailing '.git' and, on
+    code hosts, any '/tree/...', '/blob/...' suffix. Punctuation that sticks to
+    links pulled out of PDF text is stripped as well. This is only a memo key:
+    pages are fetched from the URL as found (see clean_candidate_url).
+    """
+    parts = urlsplit(clean_candidate_url(url))
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    path = parts.path.rstrip('/')
+    if host in CODE_HOSTS:
+        segments = [segment for segment in path.split('/') if segment][:2]
+        path = '/' + '/'.join(segments) if segments else ''
+    if path.endswith('.git'):
+        path = path[:-4]
+    scheme = 'https' if parts.scheme in ('http', 'https') else parts.scheme
+    return urlunsplit((scheme, host, path, '', ''))
+
+
+class ValidationService:
+    """Fetches each repository page once per run, however many entries, platforms or threads ask for it.
+
+    Concurrent requests for the same normalized URL wait for the one fetch in
+    flight, which reads the first URL asked for under that key. Pages and per-(title, repo) decisions are memoized for the whole run,
+    or, with max_pages, only the most recent max_pages of each are kept.
+    """
+
+    def __init__(self, fetch_page, max_pages=None):
+        self.fetch_page = fetch_page
+        self.max_pages = max_pages
+        self.pages = {}
+        self.inflight = {}
+        self.decisions = {}
+        self.lock = TimedLock('validation')
+
+    def page(self, url):
+        """Return the RepoPage for url, fetching it only if no one has yet."""
+        key = normalize_repo_url(url)
+        while True:
+            with self.lock:
+                if key in self.pages:
+                    metrics.count('validation_pages_total', result='memo')
+                    return self.pages[key]
+                future = self.inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = Future()
+                    self.inflight[key] = future
+            metrics.count('validation_pages_total', result='fetched' if leader else 'joined')
+            if leader:
+                return self._fetch(key, clean_candidate_url(url), future)
+            try:
+                return future.result()
+            except RequestCancelled:
+                # The leader's search was cancelled, not ours: try again, possibly as the new leader.
+                continue
+
+    def remember(self, url, page):
+        """Seed the memo with a page obtained some other way, e.g. alongside search results."""
+        key = normalize_repo_url(url)
+        with self.lock:
+            self.pages.setdefault(key, page)
+            self._trim(self.pages)
+
+    def _fetch(self, key, url, future):
+        try:
+            page = self.fetch_page(url)
+        except BaseException as e:
+            with self.lock:
+                del self.inflight[key]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            self.pages[key] = page
+            self._trim(self.pages)
+            del self.inflight[key]
+        future.set_result(page)
+        return page
+
+    def decide(self, url, title, context, decide):
+        """Memoize decide(page) per (title, repository, context)."""
+        key = (title.lower(), normalize_repo_url(url), context)
+        with self.lock:
+            if key in self.decisions:
+                return self.decisions[key]
+        decision = decide(self.page(url))
+        with self.lock:
+            self.decisions[key] = decision
+            self._trim(self.decisions)
+        return decision
+
+    def _trim(self, memo):
+        """Drop the oldest items beyond max_pages; call with the lock held."""
+        if self.max_pages is not None:
+            while len(memo) > self.max_pages:
+                del memo[next(iter(memo))]
@@ -1,121 +1,182 @@
 import argparse
+import asyncio
 import bibtexparser
 import requests
-from habanero import Crossref
-from github import Github
-from copy import deepcopy
-from bs4 import BeautifulSoup
 import re
-from PyPDF2 import PdfReader
 from googlesearch import search as google_search
-from io import BytesIO
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
+import shutil
+import sys
 import time
 import backoff
-from threading import Lock
+import numpy as np
+from urllib.parse import urlsplit
+from bibtexparser.bwriter import BibTexWriter
 from datetime import datetime
 from difflib import SequenceMatcher
+from async_engine import configure_engine, get_engine
+from bib_stream import BibStream, dedup_keys, entry_text, header_text
+from matching import matcher
+from repo_validation import RepoPage, ValidationService, normalize_repo_url
+from pdf_links import DEFAULT_MAX_BYTES, PdfTooLarge, configure_pdf_pool, parse_pdf_links, release_pdf, spool_pdf
+from pwc_index import PwCIndex
+from platform_stats import BREAKER_COOLDOWN, BREAKER_ERRORS, cancelled, configure_platform_stats, get_platform_stats, note_error, platform_name
+from doi_resolver import CROSSREF_WORKS_URL, TRUSTED_CONFIDENCE, configure_doi_resolver, get_doi_resolver, trusted_doi
+from journal import OutputJournal, entry_fingerprint
+from metrics import TimedLock, metrics, record_backoff, start_metrics_export, start_profiler
+from github_graphql import GRAPHQL_URL, GitHubGraphQL, GraphQLError
+from html_extract import PARSERS, configure_html_parser, extract, extract_first
+from http_cache import CACHE_MODES, OfflineCacheMiss, configure_cache, is_cache_miss
+from rate_limit import SHARED_SOURCES, RateLimited, configure_rate_limits, get_rate_limiter, parse_limits
+from sharding import find_shard_dirs, merge_shards, shard_dir, shard_of
+from transport import DEFAULT_MAX_PER_HOST, configure_transport, http_get, http_stream
 
 # Ensure this token is correct and has necessary permissions
 GITHUB_TOKEN = 'token'  # Ensure this token is correct and has necessary permissions  # Replace with your GitHub token
+GITHUB_GRAPHQL_URL = GRAPHQL_URL  # Point at a local stand-in server with --github_graphql_url
+PLACEHOLDER_TOKEN = 'token'
+github_token_rejected = False  # Set once GitHub answers 401, so the GraphQL API is not tried again
 
-lock = Lock()  # Create a lock for thread-safe file operations
+lock = TimedLock('save_bib_files')  # Create a lock for thread-safe file operations
+
+max_pdf_bytes = DEFAULT_MAX_BYTES  # PDFs larger than this are skipped (--max_pdf_mb)
+pwc_index = None  # PwCIndex consulted before any network platform (--pwc_index)
+offline_index = False  # Resolve entries from pwc_index alone, without network access (--offline_index)
+min_doi_confidence = TRUSTED_CONFIDENCE  # Looked-up DOIs below this are kept but not used to fetch the paper (--min_doi_confidence)
+platform_fanout = None  # At most this many platform searches per entry at once, cheapest first (--platform_fanout)
+shard_index, shard_count = 0, 1  # This process handles the entries whose key hashes to shard_index (--shard_index/--shard_count)
+FINISHED_WINDOW = 4096  # --stream reuses the results of at least this many recently finished DOIs/titles for duplicates
+
+# API clients are built once and shared by all workers so their connection pools are reused.
+clients_lock = TimedLock('clients')
+github_graphql = None
+
+def get_github_graphql():
+    """Return the shared GitHub GraphQL client."""
+    global github_graphql
+    with clients_lock:
+        if github_graphql is None:
+            github_graphql = GitHubGraphQL(GITHUB_TOKEN, GITHUB_GRAPHQL_URL)
+        return github_graphql
+
+def has_github_token():
+    """The GraphQL API only works with a real token; without one GitHub is read from its public pages."""
+    return bool(GITHUB_TOKEN) and GITHUB_TOKEN != PLACEHOLDER_TOKEN and not github_token_rejected
+
+def note_github_auth_failure(e):
+    global github_token_rejected
+    if getattr(getattr(e, 'response', None), 'status_code', None) == 401:
+        github_token_rejected = True
+
+def record_error(platform, e):
+    """Count a failed platform search, by platform and exception type; searches cancelled by first_hit did not fail."""
+    if cancelled(e):
+        return
+    metrics.count('platform_errors_total', platform=platform, error=type(e).__name__)
+    note_error(e)
+
+def in_shard(entry):
+    return shard_count == 1 or shard_of(entry['ID'], shard_count) == shard_index
 
 def fetch_doi(title):
     """Fetch DOI for a given title using Crossref."""
-    try:
-        cr = Crossref()
-        result = cr.works(query_title=title, limit=1)
-        if result['message']['items']:
-            return result['message']['items'][0].get('DOI')
-    except Exception as e:
-        print(f"Error fetching DOI for title '{title}': {e}")
-    return None
+    return get_doi_resolver().lookup(title).doi
 
-@backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_tries=5)
+@backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_tries=5, giveup=is_cache_miss, on_backoff=record_backoff)
 def fetch_pdf_from_doi(doi):
     """Fetch the PDF of the paper using the DOI, trying to find an open version if necessary."""
     try:
         url = f"https://doi.org/{doi}"
-        response = requests.get(url)
+        response = http_get(url, source='doi')
         response.raise_for_status()
         pdf_url_match = re.search(r'href="([^"]*\.pdf)"', response.text)
         if pdf_url_match:
             pdf_url = pdf_url_match.group(1)
             if not pdf_url.startswith('http'):
                 pdf_url = f"https:{pdf_url}"
-            pdf_response = requests.get(pdf_url)
+            pdf_response = http_stream(pdf_url, source='pdf')
             pdf_response.raise_for_status()
-            return BytesIO(pdf_response.content)
+            return spool_pdf(pdf_response, max_pdf_bytes)
     except requests.exceptions.RequestException as e:
-        if response.status_code == 418:
+        if e.response is not None and e.response.status_code == 418:
             return fetch_open_version(doi)
         print(f"Error fetching PDF from DOI '{doi}': {e}")
+    except PdfTooLarge as e:
+        print(f"Skipping PDF for DOI '{doi}': {e}")
     return None
 
 def fetch_open_version(doi):
     """Try to find an open access version of the paper, such as on arXiv."""
     try:
-        cr = Crossref()
-        result = cr.works(ids=doi)
+        response = http_get(f"{CROSSREF_WORKS_URL}/{doi}", source='crossref')
+        response.raise_for_status()
+        result = response.json()
         if 'URL' in result['message']:
-            response = requests.get(result['message']['URL'])
+            response = http_get(result['message']['URL'], source='doi')
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            open_access_links = soup.find_all('a', href=True)
-            for link in open_access_links:
-                if 'arxiv.org' in link['href']:
-                    return fetch_pdf_from_url(link['href'])
+            for href in extract(response.text, 'all_links'):
+                if 'arxiv.org' in href:
+                    return fetch_pdf_from_url(href)
     except Exception as e:
         print(f"Error fetching open version for DOI '{doi}': {e}")
     return None
 
-@backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_tries=5)
+@backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_tries=5, giveup=is_cache_miss, on_backoff=record_backoff)
 def fetch_pdf_from_url(url):
     """Fetch the PDF of the paper using a URL."""
     try:
         if not url.startswith("http"):
             url = "https://" + url
-        response = requests.get(url)
-        response.raise_for_status()
-        pdf_response = requests.get(response.url)
+        if 'arxiv.org/abs/' in url:
+            url = url.replace('/abs/', '/pdf/')
+        pdf_response = http_stream(url, source='pdf')
         pdf_response.raise_for_status()
-        return BytesIO(pdf_response.content)
+        return spool_pdf(pdf_response, max_pdf_bytes)
     except requests.exceptions.RequestException as e:
         print(f"Error fetching PDF from URL '{url}': {e}")
+    except PdfTooLarge as e:
+        print(f"Skipping PDF at '{url}': {e}")
     return None
 
+@metrics.timed('stage_seconds', stage='pdf_parse')
 def skim_pdf_for_links(pdf_file):
-    """Skim the PDF for links to codebases."""
-    links = []
+    """Skim the PDF for links to codebases, stopping at the first page with a code-host link."""
     try:
-        reader = PdfReader(pdf_file)
-        for page in reader.pages:
-            text = page.extract_text()
-            links.extend(re.findall(r'(https?://\S+)', text))
-        return links
+        return parse_pdf_links(pdf_file)
     except Exception as e:
         print(f"Error reading PDF: {e}")
     return []
 
-@backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_tries=5)
+@metrics.timed('platform_seconds', outcomes='platform_results_total', platform='github')
+@backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_tries=5, giveup=is_cache_miss, on_backoff=record_backoff)
 def search_github(title, authors, year, check_author, debug):
     """Search GitHub for the project online code base."""
+    if not has_github_token():
+        if debug:
+            print(f"Skipping GitHub search for title '{title}': no valid GITHUB_TOKEN")
+        return None
     try:
-        github = Github(GITHUB_TOKEN)
-        results = github.search_repositories(query=title, sort='stars', order='desc')
-        if results.totalCount > 0:
-            for repo in results:
-                if validate_repository(repo.html_url, title, authors, year, check_author, debug, repo):
-                    return repo.html_url
+        # Search results come with README, owner and commit authors, so validation needs no further request.
+        repos = get_github_graphql().search(title)
+        pages = [repo_page_from_meta(repo) for repo in repos]
+        for repo, page in zip(repos, pages):
+            if page.readme_tokens is not None:
+                validation_service.remember(repo.url, page)
+        # Score the title against every candidate README in one batched pass.
+        empty = np.zeros(0, dtype=np.int32)
+        scores = matcher.coverage([matcher.encode(title)], [page.readme_tokens if page.readme_tokens is not None else empty for page in pages])
+        for index, (repo, page) in enumerate(zip(repos, pages)):
+            # Without a README under one of the names GraphQL asks for, validation reads the repository page instead.
+            similarity = float(scores[0, index]) if page.readme_tokens is not None else None
+            if validate_repository(repo.url, title, authors, year, check_author, debug, repo, similarity):
+                return repo.url
+    except RateLimited:
+        raise
     except Exception as e:
-        if hasattr(e, 'status') and e.status == 403 and 'rate limit exceeded' in str(e):
-            if debug:
-                print("Rate limit exceeded, sleeping for 60 seconds...")
-            time.sleep(60)
-            return search_github(title, authors, year, check_author, debug)
-        if hasattr(e, 'status') and e.status == 401:
+        record_error('github', e)
+        note_github_auth_failure(e)
+        if getattr(getattr(e, 'response', None), 'status_code', None) == 401:
             if debug:
                 print(f"Error searching GitHub for title '{title}': Bad credentials. Check your GITHUB_TOKEN.")
         else:
@@ -127,52 +188,108 @@ def title_similarity(title1, title2):
     """Calculate the similarity ratio between two titles."""
     return SequenceMatcher(None, title1, title2).ratio()
 
-def validate_repository(repo_url, title, authors, year, check_author, debug, repo_obj=None):
-    """Validate if the URL points to a repository containing code relevant to the title, and optionally check authorship and year."""
-    try:
-        response = requests.get(repo_url)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            # Check for repository content and title relevance
-            readme = soup.find('article', {'class': 'markdown-body entry-content container-lg'})
-            if readme:
-                readme_text = readme.text.lower()
-                title_words = title.lower().split()
-                num_title_words = len(title_words)
-                matched_words = sum(1 for word in title_words if word in readme_text)
-                similarity_ratio = matched_words / num_title_words
-
-                if similarity_ratio >= 0.9:
-                    if year and repo_obj and repo_obj.updated_at.year > year:
-                        if debug:
-                            print(f"Repository '{repo_url}' rejected for title '{title}': updated later than paper's publication year.")
-                        return False
-                    if check_author and authors:
-                        repo_authors = [a.get_text() for a in soup.select('.commit-author')]
-                        if not any(author in repo_authors for author in authors):
-                            if debug:
-                                print(f"Repository '{repo_url}' rejected for title '{title}': authors do not match.")
-                            return False
-                    return True
-                else:
-                    if debug:
-                        print(f"Repository '{repo_url}' rejected for title '{title}': title not found in repository content with sufficient similarity (ratio: {similarity_ratio:.2f}).")
-            else:
-                if debug:
-                    print(f"Repository '{repo_url}' rejected for title '{title}': readme not found in repository content.")
-        else:
+def repo_page_from_meta(meta):
+    """RepoPage for a repository looked up through the GitHub GraphQL API."""
+    readme_tokens = matcher.encode(meta.readme) if meta.readme else None
+    return RepoPage(meta.url, 200, readme_tokens, [meta.owner] + meta.contributors)
+
+# Validation reads pages on many hosts. Those of a platform share its rate limit
+# and cache TTL; every other host gets a 'web:<host>' source of its own.
+HOST_SOURCES = {'github.com': 'github_html', 'paperswithcode.com': 'paperswithcode', 'huggingface.co': 'huggingface',
+                'zenodo.org': 'zenodo', 'figshare.com': 'figshare', 'openreview.net': 'openreview',
+                'codeocean.com': 'codeocean', 'data.mendeley.com': 'mendeley'}
+
+def page_source(url):
+    """Rate-limit and cache source for fetching url."""
+    host = urlsplit(normalize_repo_url(url)).netloc
+    return HOST_SOURCES.get(host, f'web:{host}')
+
+def fetch_repo_page(url):
+    """Fetch a repository page and keep only what validation looks at."""
+    if urlsplit(normalize_repo_url(url)).netloc == 'github.com' and has_github_token():
+        try:
+            meta = get_github_graphql().repo(url)
+            if meta is None:
+                return RepoPage(url, 404, None, [])
+            if meta.readme:
+                return repo_page_from_meta(meta)
+            # GraphQL only asks for a few README names; the public page shows whichever one the repository has.
+        except (OfflineCacheMiss, GraphQLError, requests.exceptions.HTTPError) as e:
+            # Offline, a rejected token or a failed query: read the public repository page instead
+            note_github_auth_failure(e)
+    response = http_get(url, source=page_source(url))
+    if response.status_code != 200:
+        return RepoPage(response.url, response.status_code, None, [])
+    readme = extract_first(response.text, 'github_readme')
+    authors = extract(response.text, 'github_commit_authors')
+    return RepoPage(response.url, response.status_code, matcher.encode(readme) if readme is not None else None, authors)
+
+validation_service = ValidationService(fetch_repo_page)
+
+def name_tokens(name):
+    """Lowercase words of a name or login, split at punctuation and camelCase: 'alice-smith' and 'AliceSmith' give alice, smith."""
+    return [word.lower() for word in re.findall(r'[A-Z]?[^\W\d_A-Z]+|[A-Z]+(?![^\W\d_A-Z])', name)]
+
+def authors_match(authors, repo_authors):
+    """True if the surname of any paper author is a whole word of a repository owner or commit author name."""
+    repo_words = {word for name in repo_authors for word in name_tokens(name)}
+    for author in authors:
+        surname = author.split(',')[0] if ',' in author else (author.split() or [''])[-1]
+        words = name_tokens(surname.strip(' {}'))
+        # A surname of several words (O'Brien, van Dyk) may also be written as one.
+        if words and (all(word in repo_words for word in words) or ''.join(words) in repo_words):
+            return True
+    return False
+
+@metrics.timed('validation_seconds', outcomes='validation_results_total')
+def validate_repository(repo_url, title, authors, year, check_author, debug, repo_obj=None, similarity=None):
+    """Validate if the URL points to a repository containing code relevant to the title, and optionally check authorship and year.
+
+    similarity is the title's README coverage if the caller already scored it.
+    """
+    def decide(page):
+        if page.status != 200:
+            if debug:
+                print(f"Repository '{repo_url}' rejected for title '{title}': failed to fetch content, status code {page.status}.")
+            return False
+        # Check for repository content and title relevance
+        if page.readme_tokens is None:
+            if debug:
+                print(f"Repository '{repo_url}' rejected for title '{title}': readme not found in repository content.")
+            return False
+        similarity_ratio = similarity if similarity is not None else matcher.coverage_one(matcher.encode(title), page.readme_tokens)
+        if similarity_ratio < 0.9:
+            if debug:
+                print(f"Repository '{repo_url}' rejected for title '{title}': title not found in repository content with sufficient similarity (ratio: {similarity_ratio:.2f}).")
+            return False
+        if year and updated_year and updated_year > year:
             if debug:
-                print(f"Repository '{repo_url}' rejected for title '{title}': failed to fetch content, status code {response.status_code}.")
+                print(f"Repository '{repo_url}' rejected for title '{title}': updated later than paper's publication year.")
+            return False
+        if check_author and authors:
+            if not authors_match(authors, page.authors):
+                if debug:
+                    print(f"Repository '{repo_url}' rejected for title '{title}': authors do not match.")
+                return False
+        return True
+
+    try:
+        updated_year = repo_obj.updated_at.year if repo_obj else None
+        context = (year, updated_year, check_author, tuple(authors) if check_author else ())
+        return validation_service.decide(repo_url, title, context, decide)
+    except RateLimited:
+        raise
     except Exception as e:
         if debug:
             print(f"Error validating repository at '{repo_url}' for title '{title}': {e}")
     return False
 
+@metrics.timed('platform_seconds', outcomes='platform_results_total', platform='paperswithcode')
 def search_paperswithcode(title, authors, year, check_author, debug):
     """Search PapersWithCode for the project online code base."""
     try:
         url = f"https://paperswithcode.com/api/v1/search/?q={title}"
-        response = requests.get(url)
+        response = http_get(url, source='paperswithcode')
         response.raise_for_status()
         results = response.json()
         if results.get('results'):
@@ -181,121 +298,131 @@ def search_paperswithcode(title, authors, year, check_author, debug):
                     repo_url = paper['repository']['url']
                     if validate_repository(repo_url, title, authors, year, check_author, debug):
                         return repo_url
+    except RateLimited:
+        raise
     except Exception as e:
+        record_error('paperswithcode', e)
         if debug:
             print(f"Error searching PapersWithCode for title '{title}': {e}")
     return None
 
+@metrics.timed('platform_seconds', outcomes='platform_results_total', platform='huggingface')
 def search_huggingface(title, authors, year, check_author, debug):
     """Search Hugging Face for the project online code base."""
     try:
         base_url = "https://huggingface.co/models?search="
         search_url = base_url + title.replace(" ", "+")
-        response = requests.get(search_url)
+        response = http_get(search_url, source='huggingface')
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        model_cards = soup.find_all('div', class_='model-card')
-        if model_cards:
-            for card in model_cards:
-                card_url = card.find('a', href=True)
-                if card_url and validate_repository(card_url['href'], title, authors, year, check_author, debug):
-                    return card_url['href']
+        for card_url in extract(response.text, 'huggingface'):
+            if validate_repository(card_url, title, authors, year, check_author, debug):
+                return card_url
+    except RateLimited:
+        raise
     except Exception as e:
+        record_error('huggingface', e)
         if debug:
             print(f"Error searching Hugging Face for title '{title}': {e}")
     return None
 
+@metrics.timed('platform_seconds', outcomes='platform_results_total', platform='zenodo')
 def search_zenodo(title, authors, year, check_author, debug):
     """Search Zenodo for the project online code base."""
     try:
         search_url = f"https://zenodo.org/search?page=1&size=20&q={title.replace(' ', '+')}&type=software"
-        response = requests.get(search_url)
+        response = http_get(search_url, source='zenodo')
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        results = soup.find_all('a', class_='result-item-title')
-        for result in results:
-            repo_url = result['href']
+        for repo_url in extract(response.text, 'zenodo'):
             if validate_repository(repo_url, title, authors, year, check_author, debug):
                 return repo_url
+    except RateLimited:
+        raise
     except Exception as e:
+        record_error('zenodo', e)
         if debug:
             print(f"Error searching Zenodo for title '{title}': {e}")
     return None
 
+@metrics.timed('platform_seconds', outcomes='platform_results_total', platform='figshare')
 def search_figshare(title, authors, year, check_author, debug):
     """Search Figshare for the project online code base."""
     try:
         search_url = f"https://figshare.com/search?q={title.replace(' ', '+')}&searchMode=1"
-        response = requests.get(search_url)
+        response = http_get(search_url, source='figshare')
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        results = soup.find_all('a', class_='search-result')
-        for result in results:
-            repo_url = result['href']
+        for repo_url in extract(response.text, 'figshare'):
             if validate_repository(repo_url, title, authors, year, check_author, debug):
                 return repo_url
+    except RateLimited:
+        raise
     except Exception as e:
+        record_error('figshare', e)
         if debug:
             print(f"Error searching Figshare for title '{title}': {e}")
     return None
 
+@metrics.timed('platform_seconds', outcomes='platform_results_total', platform='openreview')
 def search_openreview(title, authors, year, check_author, debug):
     """Search OpenReview for the project online code base."""
     try:
         search_url = f"https://openreview.net/search?q={title.replace(' ', '+')}"
-        response = requests.get(search_url)
+        response = http_get(search_url, source='openreview')
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        results = soup.find_all('a', class_='note_content_title')
-        for result in results:
-            repo_url = result['href']
+        for repo_url in extract(response.text, 'openreview'):
             if validate_repository(repo_url, title, authors, year, check_author, debug):
                 return repo_url
+    except RateLimited:
+        raise
     except Exception as e:
+        record_error('openreview', e)
         if debug:
             print(f"Error searching OpenReview for title '{title}': {e}")
     return None
 
+@metrics.timed('platform_seconds', outcomes='platform_results_total', platform='codeocean')
 def search_codeocean(title, authors, year, check_author, debug):
     """Search CodeOcean for the project online code base."""
     try:
         search_url = f"https://codeocean.com/explore?query={title.replace(' ', '+')}&scope=all&order=relevance"
-        response = requests.get(search_url)
+        response = http_get(search_url, source='codeocean')
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        results = soup.find_all('a', class_='paper-title')
-        for result in results:
-            repo_url = result['href']
+        for repo_url in extract(response.text, 'codeocean'):
             if validate_repository(repo_url, title, authors, year, check_author, debug):
                 return repo_url
+    except RateLimited:
+        raise
     except Exception as e:
+        record_error('codeocean', e)
         if debug:
             print(f"Error searching CodeOcean for title '{title}': {e}")
     return None
 
+@metrics.timed('platform_seconds', outcomes='platform_results_total', platform='mendeley')
 def search_mendeley_data(title, authors, year, check_author, debug):
     """Search Mendeley Data for the project online code base."""
     try:
         search_url = f"https://data.mendeley.com/search?query={title.replace(' ', '+')}"
-        response = requests.get(search_url)
+        response = http_get(search_url, source='mendeley')
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        results = soup.find_all('a', class_='search-result-title')
-        for result in results:
-            repo_url = result['href']
+        for repo_url in extract(response.text, 'mendeley'):
             if validate_repository(repo_url, title, authors, year, check_author, debug):
                 return repo_url
+    except RateLimited:
+        raise
     except requests.exceptions.HTTPError as http_err:
         if http_err.response.status_code == 404:
             pass
         else:
+            record_error('mendeley', http_err)
             if debug:
                 print(f"HTTP error occurred: {http_err}")
     except Exception as e:
+        record_error('mendeley', e)
         if debug:
             print(f"Error searching Mendeley Data for title '{title}': {e}")
     return None
 
+@metrics.timed('platform_seconds', outcomes='platform_results_total', platform='web')
 def web_search(title, authors, year, check_author, debug):
     """Search the web for the project online code base."""
     try:
@@ -304,20 +431,25 @@ def web_search(title, authors, year, check_author, debug):
         for result in search_results:
             if validate_repository(result, title, authors, year, check_author, debug):
                 return result
+    except RateLimited:
+        raise
     except Exception as e:
+        record_error('web', e)
         if debug:
             print(f"Error performing web search for title '{title}': {e}")
     return None
 
 def add_doi_to_entry(entry):
-    if 'doi' not in entry:
-        doi = fetch_doi(entry.get('title', ''))
-        if doi:
-            entry['doi'] = doi
+    get_doi_resolver().resolve([entry])
 
-def find_codebase_link(entry, check_paper, search_web, check_author, debug):
+PLATFORMS = [search_paperswithcode, search_github, search_huggingface,
+             search_zenodo, search_figshare,
+             search_openreview, search_codeocean, search_mendeley_data]
+
+def entry_search_terms(entry):
+    """Pull the title, DOI, year and author list used by the searches out of an entry."""
     title = entry.get('title', '')
-    doi = entry.get('doi', '')
+    doi = trusted_doi(entry, min_doi_confidence)
     year = None
     if 'year' in entry:
         try:
@@ -325,91 +457,489 @@ def find_codebase_link(entry, check_paper, search_web, check_author, debug):
         except ValueError:
             pass
     authors = entry.get('author', '').split(' and ')
-    platforms = [search_paperswithcode, search_github, search_huggingface, 
-                 search_zenodo, search_figshare, 
-                 search_openreview, search_codeocean, search_mendeley_data]
-    
-    # Check codebase links from platforms
-    for platform in platforms:
-        link = platform(title, authors, year, check_author, debug)
+    return title, doi, year, authors
+
+def search_paper_links(doi, title, authors, year, check_author, debug):
+    """Skim the paper's PDF for links and return the first one that validates."""
+    pdf_file = fetch_pdf_from_doi(doi)
+    if pdf_file:
+        try:
+            links = skim_pdf_for_links(pdf_file)
+        finally:
+            release_pdf(pdf_file)
+        for link in links:
+            if validate_repository(link, title, authors, year, check_author, debug):
+                return link
+    return None
+
+async def find_codebase_link_async(entry, check_paper, search_web, check_author, debug):
+    """Query every platform for the entry at once; the highest-priority valid hit wins."""
+    engine = get_engine()
+    title, doi, year, authors = entry_search_terms(entry)
+
+    # Check the offline PapersWithCode index before any network platform; unless offline,
+    # its links are validated like those of a PapersWithCode search
+    if pwc_index is not None:
+        with metrics.timer('stage_seconds', stage='pwc_index'):
+            link = pwc_index.lookup_entry(dict(entry, doi=doi))
+            if link and not offline_index:
+                valid = await engine.run_throttled(validate_repository, link, title, authors, year, check_author, debug)
+                metrics.count('pwc_index_links_total', result='valid' if valid else 'rejected')
+                link = link if valid else None
         if link:
             return link
-    
+    if offline_index:
+        return "No codebase found"
+
+    # Check codebase links from platforms; the hit kept follows PLATFORMS, but with --platform_fanout
+    # the searches cheapest per hit start first unless --fixed_platform_order
+    stats = get_platform_stats()
+    with metrics.timer('stage_seconds', stage='platforms'):
+        link = await engine.first_hit([(stats.call, (platform, title, authors, year, check_author, debug)) for platform in PLATFORMS],
+                                      platform_fanout, [PLATFORMS.index(platform) for platform in stats.order(PLATFORMS)])
+    if link:
+        return link
+
     # Skim PDF for codebase links if option is enabled
     if check_paper and doi:
-        pdf_file = fetch_pdf_from_doi(doi)
-        if pdf_file:
-            links = skim_pdf_for_links(pdf_file)
-            for link in links:
-                if validate_repository(link, title, authors, year, check_author, debug):
-                    return link
-    
+        with metrics.timer('stage_seconds', stage='paper'):
+            link = await engine.run_throttled(search_paper_links, doi, title, authors, year, check_author, debug)
+        if link:
+            return link
+
     # Perform web search for codebase links if option is enabled
     if search_web:
-        link = web_search(title, authors, year, check_author, debug)
+        with metrics.timer('stage_seconds', stage='web_search'):
+            link = await engine.run_throttled(web_search, title, authors, year, check_author, debug)
         if link:
             return link
-    
+
     return "No codebase found"
 
-def save_bib_files(with_code, without_code, output_dir):
-    with lock:
-        with open(os.path.join(output_dir, 'with_code.bib'), 'w', encoding='utf-8') as bibtex_file:
-            bibtexparser.dump(with_code, bibtex_file)
-        with open(os.path.join(output_dir, 'without_code.bib'), 'w', encoding='utf-8') as bibtex_file:
-            bibtexparser.dump(without_code, bibtex_file)
+def find_codebase_link(entry, check_paper, search_web, check_author, debug):
+    """Synchronous wrapper around find_codebase_link_async."""
+    return asyncio.run(find_codebase_link_async(entry, check_paper, search_web, check_author, debug))
+
+def print_rate_limit_report():
+    """Summarize how long each source spent waiting on its rate limit."""
+    for source, stat in sorted(get_rate_limiter().report().items()):
+        print(f"Rate limit '{source}': {stat['requests']} requests, {stat['blocked_seconds']:.1f}s blocked in threads, "
+              f"{stat['queued']} calls queued for {stat['queued_seconds']:.1f}s")
+
+def save_platform_stats(report):
+    """Fold this run's platform outcomes into the stats file, printing the --platform_stats report first."""
+    stats = get_platform_stats()
+    order = [platform_name(platform) for platform in stats.order(PLATFORMS)]
+    if report:
+        print(stats.report(order))
+    stats.save(order)
+
+def save_bib_files(with_code, without_code, output_dir, writer=None):
+    """Write both output files, replacing the old ones atomically."""
+    with lock, metrics.timer('stage_seconds', stage='save'):
+        for name, database in (('with_code.bib', with_code), ('without_code.bib', without_code)):
+            path = os.path.join(output_dir, name)
+            with open(path + '.tmp', 'w', encoding='utf-8') as bibtex_file:
+                bibtexparser.dump(database, bibtex_file, writer)
+            os.replace(path + '.tmp', path)
+
+def compact_output(bib_database, journal, output_dir):
+    """Rebuild with_code.bib/without_code.bib from the journal; bibtexparser writes the entries sorted by citation key."""
+    order = [(entry['ID'], entry_fingerprint(entry)) for entry in bib_database.entries]
+    found, not_found = journal.compact(order, bib_database, lambda with_code, without_code: save_bib_files(with_code, without_code, output_dir))
+    print(f"Wrote {found} entries to with_code.bib and {not_found} to without_code.bib")
+
+def compact_output_stream(file_path, journal, output_dir):
+    """Rebuild with_code.bib/without_code.bib from the journal, re-reading the input instead of keeping it in memory.
+
+    Entries are written in input order as their records are read back, so
+    neither the input nor the output is ever held whole.
+    """
+    stream = BibStream(file_path)
+    order = ((entry['ID'], entry_fingerprint(entry)) for entry in stream if in_shard(entry))
+    writer = BibTexWriter()
+    writer.order_entries_by = None
+    paths = {True: os.path.join(output_dir, 'with_code.bib'), False: os.path.join(output_dir, 'without_code.bib')}
+    with lock, metrics.timer('stage_seconds', stage='save'):
+        bodies = {has_code: open(path + '.body', 'w', encoding='utf-8') for has_code, path in paths.items()}
+        written = {True: 0, False: 0}
 
-def process_entry(entry, with_code, without_code, check_paper, search_web, check_author, output_dir, debug):
+        def write(record):
+            has_code = bool(record['has_code'])
+            if written[has_code]:
+                bodies[has_code].write(writer.entry_separator)
+            bodies[has_code].write(entry_text(record['entry'], writer))
+            written[has_code] += 1
+
+        try:
+            found, not_found = journal.compact_stream(order, write)
+        finally:
+            for body in bodies.values():
+                body.close()
+        # The header is complete only once the whole input has been read.
+        header = header_text(stream.header, writer)
+        for path in paths.values():
+            with open(path + '.tmp', 'w', encoding='utf-8') as bibtex_file, open(path + '.body', 'r', encoding='utf-8') as body:
+                bibtex_file.write(header)
+                shutil.copyfileobj(body, bibtex_file)
+            os.replace(path + '.tmp', path)
+            os.remove(path + '.body')
+    print(f"Wrote {found} entries to with_code.bib and {not_found} to without_code.bib")
+
+def record_result(entry, fingerprint, codebase_link, journal, started=None):
+    has_code = bool(codebase_link and codebase_link != "No codebase found")
+    if has_code:
+        entry['url'] = codebase_link
+    seconds = time.monotonic() - started if started else None
+    journal.record(entry['ID'], fingerprint, entry, has_code, seconds)
+    metrics.count('entries_total', has_code=has_code)
+    if seconds is not None:
+        metrics.observe('entry_seconds', seconds)
+
+def note_unrecorded(entry, e):
+    """An entry whose searches were still throttled is not journalled, so that the next run searches it again."""
+    metrics.count('entries_unrecorded_total', reason='rate_limited')
+    print(f"Not recording entry '{entry.get('title', 'No Title')}' this run: {e}")
+
+def process_entry(entry, fingerprint, journal, check_paper, search_web, check_author, debug):
+    started = time.monotonic()
     try:
-        add_doi_to_entry(entry)
         codebase_link = find_codebase_link(entry, check_paper, search_web, check_author, debug)
-        if codebase_link and codebase_link != "No codebase found":
-            entry['url'] = codebase_link
-            with_code.entries.append(entry)
-        else:
-            without_code.entries.append(entry)
-        
-        save_bib_files(with_code, without_code, output_dir)
+        record_result(entry, fingerprint, codebase_link, journal, started)
+        return entry
+    except RateLimited as e:
+        note_unrecorded(entry, e)
         return entry
     except Exception as e:
         if debug:
             print(f"Error processing entry '{entry.get('title', 'No Title')}': {e}")
         return entry
 
-def process_bibtex(file_path, check_paper, search_web, check_author, num_threads, output_dir, debug):
+async def process_entry_async(entry, fingerprint, journal, check_paper, search_web, check_author, debug):
+    engine = get_engine()
+    started = time.monotonic()
+    try:
+        codebase_link = await find_codebase_link_async(entry, check_paper, search_web, check_author, debug)
+        await engine.run_blocking(record_result, entry, fingerprint, codebase_link, journal, started)
+        return codebase_link
+    except RateLimited as e:
+        note_unrecorded(entry, e)
+        return None
+    except Exception as e:
+        if debug:
+            print(f"Error processing entry '{entry.get('title', 'No Title')}': {e}")
+        return None
+
+async def process_entries_async(work, journal, check_paper, search_web, check_author, num_threads, debug):
+    """Run every entry on one event loop, with at most num_threads entries in flight."""
+    slots = asyncio.Semaphore(num_threads)
+    total_entries = len(work)
+
+    async def run(idx, entry, fingerprint):
+        async with slots:
+            print(f"Processing entry {idx}/{total_entries}: {entry.get('title', 'No Title')}")
+            return await process_entry_async(entry, fingerprint, journal, check_paper, search_web, check_author, debug)
+
+    tasks = [asyncio.ensure_future(run(idx, entry, fingerprint)) for idx, (entry, fingerprint) in enumerate(work, start=1)]
+    for completed, task in enumerate(asyncio.as_completed(tasks), start=1):
+        await task
+        print(f"Completed entry {completed}/{total_entries}")
+
+async def process_stream_async(stream, journal, check_paper, search_web, check_author, num_threads, debug):
+    """Process entries as they are parsed, with at most num_threads in flight.
+
+    Entries are read a chunk at a time, and only once a slot is free, so
+    memory does not grow with the input. An entry with the same DOI or
+    normalized title as one in flight, or as one of the last few thousand
+    finished, is not searched again: it waits for that entry, holding a slot
+    like any other, and is recorded with its result.
+    """
+    engine = get_engine()
+    slots = asyncio.Semaphore(num_threads)
+    chunk_size = max(64, 4 * num_threads)
+    max_finished = max(FINISHED_WINDOW, 64 * num_threads)
+    entries = iter(stream)
+    inflight = {}  # dedup key -> future of the leading entry's result
+    finished = {}  # dedup key -> (codebase link, doi, doi_confidence), the most recently used max_finished
+    tasks = set()
+    counts = {'read': 0, 'skipped': 0, 'started': 0, 'completed': 0, 'duplicates': 0}
+
+    def take_chunk():
+        chunk = []
+        for entry in entries:
+            counts['read'] += 1
+            # Fingerprint before processing: the workers add doi/url fields to the entries.
+            fingerprint = entry_fingerprint(entry)
+            if journal.is_done(entry['ID'], fingerprint):
+                counts['skipped'] += 1
+                continue
+            chunk.append((entry, fingerprint, dedup_keys(entry)))
+            if len(chunk) >= chunk_size:
+                break
+        return chunk
+
+    def completed():
+        counts['completed'] += 1
+        print(f"Completed entry {counts['completed']}/{counts['read'] - counts['skipped']}")
+
+    async def lead(entry, fingerprint, keys, future):
+        try:
+            counts['started'] += 1
+            print(f"Processing entry {counts['started']}: {entry.get('title', 'No Title')}")
+            link = await process_entry_async(entry, fingerprint, journal, check_paper, search_web, check_author, debug)
+        finally:
+            slots.release()
+        result = None if link is None else (link, entry.get('doi'), entry.get('doi_confidence'))
+        for key in keys:
+            if inflight.get(key) is future:
+                del inflight[key]
+            if result is not None and key not in finished:
+                finished[key] = result
+                if len(finished) > max_finished:
+                    del finished[next(iter(finished))]
+        future.set_result(result)
+        completed()
+
+    async def follow(entry, fingerprint, keys, result):
+        """Record entry with the result of the entry it duplicates; called holding a slot, which it releases."""
+        try:
+            if asyncio.isfuture(result):
+                result = await result
+        except BaseException:
+            slots.release()
+            raise
+        if result is None:
+            # The leading entry failed; try this one on its own, in the slot it already holds.
+            await lead(entry, fingerprint, keys, asyncio.get_running_loop().create_future())
+            return
+        try:
+            link, doi, doi_confidence = result
+            if doi and not entry.get('doi'):
+                entry['doi'] = doi
+                if doi_confidence:
+                    entry['doi_confidence'] = doi_confidence
+            counts['duplicates'] += 1
+            await engine.run_blocking(record_result, entry, fingerprint, link, journal, time.monotonic())
+        finally:
+            slots.release()
+        completed()
+
+    def spawn(coroutine):
+        task = asyncio.ensure_future(coroutine)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    while True:
+        chunk = await engine.run_blocking(take_chunk)
+        if not chunk:
+            break
+        # Resolve missing DOIs a chunk at a time, one Crossref query per distinct title.
+        if not offline_index:
+            with metrics.timer('stage_seconds', stage='doi_resolve'):
+                await engine.run_blocking(get_doi_resolver().resolve, [entry for entry, _, _ in chunk])
+        for entry, fingerprint, keys in chunk:
+            await slots.acquire()
+            known = None
+            for key in keys:
+                if key in finished:
+                    # Move it to the back so that entries duplicated often stay in the window.
+                    known = finished[key] = finished.pop(key)
+                else:
+                    known = inflight.get(key)
+                if known is not None:
+                    break
+            if known is not None:
+                spawn(follow(entry, fingerprint, keys, known))
+                continue
+            future = asyncio.get_running_loop().create_future()
+            for key in keys:
+                inflight[key] = future
+            spawn(lead(entry, fingerprint, keys, future))
+
+    while tasks:
+        await asyncio.gather(*list(tasks))
+    if counts['skipped']:
+        print(f"Resuming: {counts['skipped']} of {counts['read']} entries already done")
+    if counts['duplicates']:
+        print(f"Reused results for {counts['duplicates']} duplicate entries")
+
+def process_bibtex_stream(file_path, check_paper, search_web, check_author, num_threads, output_dir, debug, compact_only=False):
+    """Like process_bibtex, but never holds the whole input or output in memory."""
+    try:
+        journal = OutputJournal(output_dir)
+        try:
+            if not compact_only:
+                entries = (entry for entry in BibStream(file_path) if in_shard(entry))
+                asyncio.run(process_stream_async(entries, journal, check_paper, search_web, check_author, num_threads, debug))
+        finally:
+            journal.close()
+            with metrics.timer('stage_seconds', stage='compact'):
+                compact_output_stream(file_path, journal, output_dir)
+
+    except Exception as e:
+        print(f"Error processing BibTeX file '{file_path}': {e}")
+
+def process_bibtex(file_path, check_paper, search_web, check_author, num_threads, output_dir, debug, engine='async', compact_only=False):
     try:
         with open(file_path, 'r', encoding='utf-8') as bibtex_file:
             bib_database = bibtexparser.load(bibtex_file)
-        
-        with_code = deepcopy(bib_database)
-        without_code = deepcopy(bib_database)
-        with_code.entries = []
-        without_code.entries = []
-
-        total_entries = len(bib_database.entries)
-        futures = []
-        with ThreadPoolExecutor(max_workers=num_threads) as executor:
-            for idx, entry in enumerate(bib_database.entries, start=1):
-                print(f"Processing entry {idx}/{total_entries}: {entry.get('title', 'No Title')}")
-                futures.append(executor.submit(process_entry, entry, with_code, without_code, check_paper, search_web, check_author, output_dir, debug))
-            
-            for future in as_completed(futures):
-                future.result()
-                print(f"Completed entry {len(with_code.entries) + len(without_code.entries)}/{total_entries}")
+        bib_database.entries = [entry for entry in bib_database.entries if in_shard(entry)]
+
+        journal = OutputJournal(output_dir)
+        try:
+            if not compact_only:
+                # Fingerprint before processing: the workers add doi/url fields to the entries.
+                work = []
+                for entry in bib_database.entries:
+                    fingerprint = entry_fingerprint(entry)
+                    if not journal.is_done(entry['ID'], fingerprint):
+                        work.append((dict(entry), fingerprint))
+                skipped = len(bib_database.entries) - len(work)
+                if skipped:
+                    print(f"Resuming: {skipped} of {len(bib_database.entries)} entries already done")
+
+                # Resolve missing DOIs for all entries up front, one Crossref query per distinct title.
+                if not offline_index:
+                    with metrics.timer('stage_seconds', stage='doi_resolve'):
+                        resolved = get_doi_resolver().resolve([entry for entry, _ in work], bib_database.entries)
+                    print(f"Found DOIs for {resolved} entries")
+
+                total_entries = len(work)
+                if engine == 'async':
+                    asyncio.run(process_entries_async(work, journal, check_paper, search_web, check_author, num_threads, debug))
+                else:
+                    futures = []
+                    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+                        for idx, (entry, fingerprint) in enumerate(work, start=1):
+                            print(f"Processing entry {idx}/{total_entries}: {entry.get('title', 'No Title')}")
+                            futures.append(executor.submit(process_entry, entry, fingerprint, journal, check_paper, search_web, check_author, debug))
+
+                        for completed, future in enumerate(as_completed(futures), start=1):
+                            future.result()
+                            print(f"Completed entry {completed}/{total_entries}")
+        finally:
+            journal.close()
+            with metrics.timer('stage_seconds', stage='compact'):
+                compact_output(bib_database, journal, output_dir)
 
     except Exception as e:
         print(f"Error processing BibTeX file '{file_path}': {e}")
 
+def merge_outputs(argv):
+    """The merge subcommand: combine the outputs of all shards in --output_dir."""
+    parser = argparse.ArgumentParser(prog='scrape_codebases_parallel.py merge', description='Combine the with_code.bib/without_code.bib files of every shard in output_dir into one pair.')
+    parser.add_argument('--output_dir', required=True, help='The --output_dir the shards were run with')
+    parser.add_argument('--bib_file', default=None, help='Order entries as in this input file instead of by citation key')
+    parser.add_argument('--allow_missing', action='store_true', help='Merge even if some shards have no output yet')
+    parser.add_argument('--min_doi_confidence', type=float, default=TRUSTED_CONFIDENCE, help='Looked-up DOIs matching the title less well than this do not make two entries duplicates')
+    args = parser.parse_args(argv)
+    try:
+        dirs, count = find_shard_dirs(args.output_dir)
+    except ValueError as e:
+        parser.error(str(e))
+    if not dirs:
+        parser.error(f"No shard-*-of-* directories in {args.output_dir}")
+    missing = [index for index in range(count)
+               if index not in dirs or not os.path.exists(os.path.join(dirs[index], 'with_code.bib'))]
+    if missing and not args.allow_missing:
+        parser.error(f"Shards {', '.join(map(str, missing))} of {count} have no output yet; pass --allow_missing to merge anyway")
+    with_code, without_code, adopted = merge_shards([dirs[index] for index in sorted(dirs)], args.bib_file, args.min_doi_confidence)
+    writer = None
+    if args.bib_file:
+        writer = BibTexWriter()
+        writer.order_entries_by = None
+    save_bib_files(with_code, without_code, args.output_dir, writer)
+    print(f"Merged {len(dirs)} of {count} shards: {len(with_code.entries)} entries with code, {len(without_code.entries)} without"
+          + (f"; {adopted} duplicates took a codebase found in another shard" if adopted else ''))
+
 if __name__ == "__main__":
+    if sys.argv[1:2] == ['merge']:
+        merge_outputs(sys.argv[2:])
+        sys.exit()
     parser = argparse.ArgumentParser(description='Process a BibTeX file to add DOIs and categorize entries based on the availability of codebases.')
     parser.add_argument('--bib_file', required=True, help='Path to the BibTeX file')
     parser.add_argument('--check_paper', action='store_true', help='Skim the associated paper\'s PDF for links to codebases using the DOI')
     parser.add_argument('--search_web', action='store_true', help='Search the web for codebases')
     parser.add_argument('--check_author', action='store_true', help='Check if the author of the codebase is one of the authors of the paper')
-    parser.add_argument('--num_threads', type=int, default=4, help='Number of threads to run in parallel')
+    parser.add_argument('--num_threads', type=int, default=4, help='Number of entries to process in parallel')
+    parser.add_argument('--io_threads', type=int, default=None, help='Threads available for blocking network calls (default: 4 x num_threads)')
+    parser.add_argument('--engine', choices=['async', 'threads'], default='async', help='async: one event loop queries all platforms of an entry at once; threads: one worker thread per entry, as before')
     parser.add_argument('--output_dir', required=True, help='Directory to save the output BibTeX files')
     parser.add_argument('--debug_valid_repo', action='store_true', help='Print debug statements during repository validation')
+    parser.add_argument('--stream', action='store_true', help='Parse and write entries incrementally and process each duplicate DOI/title once, so memory stays flat on very large files; output keeps input order (async engine only)')
+    parser.add_argument('--shard_index', type=int, default=0, help='Process only the entries whose citation key hashes to this shard, writing to <output_dir>/shard-<i>-of-<n>; combine the shards with the merge subcommand')
+    parser.add_argument('--shard_count', type=int, default=1, help='Number of shards the input is split into, e.g. $SLURM_ARRAY_TASK_COUNT')
+    parser.add_argument('--rate_budget_file', default=None, help='Draw the GitHub rate limits from a budget in this file, shared with every other process given the same file (needs a filesystem with fcntl locks)')
+    parser.add_argument('--shared_sources', default=','.join(SHARED_SOURCES), help='Sources whose budget --rate_budget_file shares')
+    parser.add_argument('--platform_stats', action='store_true', help='Print per-platform hit rates, latencies and errors, and requests per found codebase for recent runs, at the end')
+    parser.add_argument('--platform_stats_file', default=None, help='File keeping platform outcomes across runs (default: <output_dir>/platform_stats.json)')
+    parser.add_argument('--fixed_platform_order', action='store_true', help='With --platform_fanout, start platform searches in their built-in priority order instead of by expected cost per hit')
+    parser.add_argument('--platform_fanout', type=int, default=None, help='Search at most this many platforms per entry at once, in order, starting the next when one comes back empty (default: all at once)')
+    parser.add_argument('--breaker_errors', type=int, default=BREAKER_ERRORS, help='Skip a platform for --breaker_cooldown seconds after this many failed searches in a row; 0 never skips')
+    parser.add_argument('--breaker_cooldown', type=float, default=BREAKER_COOLDOWN, help='Seconds a platform is skipped once its breaker trips')
+    parser.add_argument('--compact_only', action='store_true', help='Only rebuild with_code.bib/without_code.bib from the journal of a previous run')
+    parser.add_argument('--max_pdf_mb', type=int, default=DEFAULT_MAX_BYTES // 1024 ** 2, help='Skip papers whose PDF is larger than this')
+    parser.add_argument('--pdf_workers', type=int, default=None, help='Processes used to parse PDFs (default: up to 4; 0 parses in the I/O threads)')
+    parser.add_argument('--pwc_index', default=None, help='PapersWithCode links index built with src/pwc_index.py, checked before any network platform; its links are validated like search hits, except with --offline_index')
+    parser.add_argument('--offline_index', action='store_true', help='Resolve entries from --pwc_index only, without any network access; index links are then taken unvalidated, so --check_author does not apply')
+    parser.add_argument('--mailto', default=None, help='Contact address sent with Crossref queries so they go to the faster "polite" pool')
+    parser.add_argument('--doi_memo', default=None, help='File memoizing title-to-DOI lookups across runs (default: <output_dir>/doi_memo.jsonl)')
+    parser.add_argument('--min_doi_confidence', type=float, default=TRUSTED_CONFIDENCE, help='Looked-up DOIs matching the title less well than this are recorded but not used to fetch the paper')
+    parser.add_argument('--rate_limits', default=None, help='Override per-source request rates, e.g. "github=0.5,doi=10:20" (requests/sec[:burst]); "web" sets the rate of each other host')
+    parser.add_argument('--github_token', default=os.environ.get('GITHUB_TOKEN', GITHUB_TOKEN), help='GitHub token for the GraphQL API (default: $GITHUB_TOKEN); without one, GitHub search is skipped and repositories are read from their public pages')
+    parser.add_argument('--github_graphql_url', default=GRAPHQL_URL, help='GitHub GraphQL endpoint, e.g. a local stand-in server for testing')
+    parser.add_argument('--html_parser', choices=PARSERS, default='fast', help='fast: streaming extraction of only the needed elements, falling back to BeautifulSoup; bs4: always BeautifulSoup')
+    parser.add_argument('--max_per_host', type=int, default=DEFAULT_MAX_PER_HOST, help='Maximum number of concurrent requests to any single host')
+    parser.add_argument('--timeout', type=float, default=30, help='Read timeout in seconds for every HTTP request')
+    parser.add_argument('--metrics_out', default=None, help='Write timers, counters and lock waits here periodically and at exit; .prom for a Prometheus textfile, anything else JSON')
+    parser.add_argument('--metrics_interval', type=float, default=30, help='Seconds between --metrics_out writes')
+    parser.add_argument('--profile', default=None, help='Sample every thread while running and write the hottest functions to this file at exit')
+    parser.add_argument('--stand_in_url', default=None, help='Send every request to this server instead, e.g. benchmarks/stand_in.py')
+    parser.add_argument('--cache_dir', default=None, help='Directory for the HTTP response cache (default: <output_dir>/http_cache)')
+    parser.add_argument('--cache_mode', choices=CACHE_MODES, default='readwrite', help='off: no cache; read: use cached responses but store nothing new; readwrite: use and fill the cache; offline: never touch the network')
+    parser.add_argument('--cache_max_mb', type=int, default=2048, help='Evict least recently used responses once the cache grows past this size')
 
     args = parser.parse_args()
+    if not 0 <= args.shard_index < args.shard_count:
+        parser.error('--shard_index must be between 0 and --shard_count - 1')
+    if args.shard_count > 1:
+        shard_index, shard_count = args.shard_index, args.shard_count
+        args.output_dir = shard_dir(args.output_dir, shard_index, shard_count)
+    if args.stream and args.engine != 'async':
+        parser.error('--stream requires --engine async')
+    if args.offline_index:
+        if not args.pwc_index:
+            parser.error('--offline_index requires --pwc_index')
+        args.cache_mode = 'offline'
     os.makedirs(args.output_dir, exist_ok=True)
-    process_bibtex(args.bib_file, args.check_paper, args.search_web, args.check_author, args.num_threads, args.output_dir, args.debug_valid_repo)
+    if args.metrics_out:
+        start_metrics_export(args.metrics_out, args.metrics_interval)
+    if args.profile:
+        start_profiler(args.profile)
+    GITHUB_TOKEN = args.github_token
+    GITHUB_GRAPHQL_URL = args.github_graphql_url
+    max_pdf_bytes = args.max_pdf_mb * 1024 ** 2
+    min_doi_confidence = args.min_doi_confidence
+    platform_fanout = args.platform_fanout
+    configure_html_parser(args.html_parser)
+    if args.pdf_workers is not None:
+        configure_pdf_pool(args.pdf_workers)
+    if args.pwc_index:
+        pwc_index = PwCIndex(args.pwc_index)
+        offline_index = args.offline_index
+    io_threads = args.io_threads or 4 * args.num_threads
+    configure_engine(io_threads)
+    configure_doi_resolver(args.output_dir, args.mailto, io_threads, args.doi_memo)
+    configure_platform_stats(args.output_dir, args.platform_stats_file, args.breaker_errors, args.breaker_cooldown, not args.fixed_platform_order)
+    configure_transport(io_threads, args.max_per_host, (10, args.timeout), args.stand_in_url)
+    configure_rate_limits(parse_limits(args.rate_limits), args.rate_budget_file, args.shared_sources.split(','))
+    configure_cache(args.cache_dir or os.path.join(args.output_dir, 'http_cache'), args.cache_mode, args.cache_max_mb * 1024 ** 2)
+    if args.stream:
+        # Keep a window of recently fetched repository pages instead of every page of the run.
+        validation_service.max_pages = 64 * args.num_threads
+        process_bibtex_stream(args.bib_file, args.check_paper, args.search_web, args.check_author, args.num_threads, args.output_dir, args.debug_valid_repo, args.compact_only)
+    else:
+        process_bibtex(args.bib_file, args.check_paper, args.search_web, args.check_author, args.num_threads, args.output_dir, args.debug_valid_repo, args.engine, args.compact_only)
+    if not args.compact_only:
+        save_platform_stats(args.platform_stats)
+    print_rate_limit_report()
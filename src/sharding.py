@@ -0,0 +1,106 @@
+"""Split one bibliography across several processes or nodes, and merge their outputs.
+
+Run shard i of n with
+
+    python src/scrape_codebases_parallel.py --bib_file refs.bib --output_dir out --shard_index i --shard_count n
+
+Each shard takes the entries whose citation key hashes to it and keeps its
+outputs, journal and memos in out/shard-<i>-of-<n>. Once all shards are done,
+
+    python src/scrape_codebases_parallel.py merge --output_dir out
+
+writes out/with_code.bib and out/without_code.bib.
+"""
+import glob
+import hashlib
+import os
+import re
+
+import bibtexparser
+from bibtexparser.bibdatabase import BibDatabase
+
+from bib_stream import BibStream, dedup_keys
+from doi_resolver import TRUSTED_CONFIDENCE, trusted_doi
+from journal import empty_database
+
+SHARD_DIR_RE = re.compile(r'shard-(\d+)-of-(\d+)$')
+
+
+def shard_of(key, shard_count):
+    """The shard a citation key belongs to; the same on every machine and Python version."""
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') % shard_count
+
+
+def shard_dir(output_dir, shard_index, shard_count):
+    return os.path.join(output_dir, f'shard-{shard_index:03d}-of-{shard_count:03d}')
+
+
+def find_shard_dirs(output_dir):
+    """Map shard index to directory for the shard layout found in output_dir, and return the shard count.
+
+    Raises ValueError if output_dir holds shards of more than one layout.
+    """
+    dirs = {}
+    counts = set()
+    for path in sorted(glob.glob(os.path.join(output_dir, 'shard-*-of-*'))):
+        match = SHARD_DIR_RE.search(path)
+        if match and os.path.isdir(path):
+            dirs[int(match.group(1))] = path
+            counts.add(int(match.group(2)))
+    if len(counts) > 1:
+        raise ValueError(f"{output_dir} holds shards of {len(counts)} different runs ({', '.join(map(str, sorted(counts)))} shards); remove the stale ones")
+    return dirs, counts.pop() if counts else 0
+
+
+def load_bib(path):
+    if not os.path.exists(path):
+        return BibDatabase()
+    with open(path, 'r', encoding='utf-8') as bibtex_file:
+        return bibtexparser.load(bibtex_file)
+
+
+def merge_shards(shard_dirs, order_file=None, min_doi_confidence=TRUSTED_CONFIDENCE):
+    """Combine the with_code.bib/without_code.bib of every shard into one pair of databases.
+
+    An entry found in more than one shard is kept once, preferring a copy
+    with a codebase. An entry without a codebase that has the same DOI or
+    normalized title as one with a codebase takes over its url; looked-up
+    DOIs below min_doi_confidence do not count. Entries are
+    in the order of order_file if given, otherwise sorted by key on output.
+    """
+    header = BibDatabase()
+    entries = {}
+    for path in shard_dirs:
+        for has_code, name in ((True, 'with_code.bib'), (False, 'without_code.bib')):
+            database = load_bib(os.path.join(path, name))
+            header.strings.update(database.strings)
+            header.preambles += [preamble for preamble in database.preambles if preamble not in header.preambles]
+            header.comments += [comment for comment in database.comments if comment not in header.comments]
+            for entry in database.entries:
+                if has_code or entry['ID'] not in entries:
+                    entries[entry['ID']] = (entry, has_code)
+
+    links = {}
+    for entry, has_code in entries.values():
+        if has_code:
+            for key in dedup_keys(entry, trusted_doi(entry, min_doi_confidence)):
+                links.setdefault(key, entry['url'])
+    adopted = 0
+    for entry_id, (entry, has_code) in entries.items():
+        if not has_code:
+            link = next((links[key] for key in dedup_keys(entry, trusted_doi(entry, min_doi_confidence)) if key in links), None)
+            if link:
+                entry['url'] = link
+                entries[entry_id] = (entry, True)
+                adopted += 1
+
+    ordered = list(entries.values())
+    if order_file:
+        position = {entry['ID']: i for i, entry in enumerate(BibStream(order_file))}
+        ordered.sort(key=lambda item: position.get(item[0]['ID'], len(position)))
+
+    with_code, without_code = empty_database(header), empty_database(header)
+    for entry, has_code in ordered:
+        (with_code if has_code else without_code).entries.append(entry)
+    return with_code, without_code, adopted
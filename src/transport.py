@@ -0,0 +1,155 @@
+import contextvars
+from threading import BoundedSemaphore, Lock
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from http_cache import OfflineCacheMiss, cached_get, get_cache
+from metrics import metrics
+from rate_limit import RateLimited, get_rate_limiter
+
+DEFAULT_TIMEOUT = (10, 30)  # (connect, read) seconds
+DEFAULT_MAX_PER_HOST = 4
+USER_AGENT = 'codebase_finder (+https://github.com/Brandonio-c/codebase_finder)'
+
+# Set by the async engine to a threading.Event that is fired when the result of
+# the current call is no longer needed; requests made after that are skipped.
+cancel_scope = contextvars.ContextVar('cancel_scope', default=None)
+
+# Set to a Counter by code that wants to know how many requests, per source,
+# were sent on its behalf in the current context.
+request_tally = contextvars.ContextVar('request_tally', default=None)
+
+
+class RequestCancelled(Exception):
+    """Raised instead of sending a request whose result is no longer wanted."""
+
+
+def check_cancelled(url):
+    event = cancel_scope.get()
+    if event is not None and event.is_set():
+        raise RequestCancelled(f"Request to '{url}' cancelled")
+
+
+class Transport:
+    """Shared HTTP layer: one keep-alive Session per host and a cap on in-flight requests per host."""
+
+    def __init__(self, num_threads=4, max_per_host=DEFAULT_MAX_PER_HOST, timeout=DEFAULT_TIMEOUT, stand_in_url=None):
+        self.max_per_host = max_per_host
+        # No host ever has more than max_per_host requests in flight, so a bigger pool would just idle.
+        self.pool_size = max(1, min(num_threads, max_per_host))
+        self.timeout = timeout
+        self.stand_in_url = stand_in_url and urlsplit(stand_in_url)
+        self.sessions = {}
+        self.semaphores = {}
+        self.lock = Lock()
+
+    def _new_session(self):
+        # 429s and Retry-After are left to the rate limiter, which can park the call instead of sleeping here.
+        session = requests.Session()
+        session.headers['User-Agent'] = USER_AGENT
+        retry = Retry(total=2, connect=2, read=0, status=2, backoff_factor=0.5,
+                      status_forcelist=(500, 502, 503, 504), allowed_methods=('GET', 'HEAD', 'POST'),
+                      raise_on_status=False, respect_retry_after_header=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _host_state(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self.lock:
+            if host not in self.sessions:
+                self.sessions[host] = self._new_session()
+                self.semaphores[host] = BoundedSemaphore(self.max_per_host)
+            return self.sessions[host], self.semaphores[host]
+
+    def _route(self, url):
+        """Point url at the stand-in server, keeping the real host as the first path segment."""
+        parts = urlsplit(url)
+        base = self.stand_in_url
+        return urlunsplit((base.scheme, base.netloc, base.path.rstrip('/') + '/' + parts.netloc + parts.path, parts.query, ''))
+
+    def request(self, method, url, **kwargs):
+        """Send a request on the host's pooled session, waiting for a free per-host slot."""
+        # Limits stay keyed by the real host, so a stand-in server sees the same concurrency as the real ones would.
+        session, semaphore = self._host_state(url)
+        if self.stand_in_url:
+            url = self._route(url)
+        kwargs.setdefault('timeout', self.timeout)
+        check_cancelled(url)
+        with semaphore:
+            check_cancelled(url)
+            return session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+            self.semaphores.clear()
+
+
+_transport = Transport()
+
+
+def configure_transport(num_threads=4, max_per_host=DEFAULT_MAX_PER_HOST, timeout=DEFAULT_TIMEOUT, stand_in_url=None):
+    """Replace the process-wide transport, sizing its pools for num_threads workers.
+
+    With stand_in_url every request goes to that server instead, as
+    <stand_in_url>/<real host>/<path>; see benchmarks/stand_in.py.
+    """
+    global _transport
+    _transport.close()
+    _transport = Transport(num_threads, max_per_host, timeout, stand_in_url)
+    return _transport
+
+
+def get_transport():
+    return _transport
+
+
+def throttled_request(source, method, url, **kwargs):
+    """Send a request on the pooled transport within source's rate-limit budget.
+
+    Raises RateLimited when the budget is exhausted or the server says so,
+    leaving the caller (normally the async engine) to retry later.
+    """
+    limiter = get_rate_limiter()
+    limiter.acquire(source)
+    with metrics.timer('http_request_seconds', source=source):
+        response = _transport.request(method, url, **kwargs)
+    metrics.count('http_requests_total', source=source, status=response.status_code)
+    tally = request_tally.get()
+    if tally is not None:
+        tally[source] += 1
+    backoff = limiter.update_from_headers(source, response.status_code, response.headers)
+    if backoff is not None and response.status_code in (403, 429, 503):
+        raise RateLimited(source, backoff)
+    return response
+
+
+def http_get(url, source='default', headers=None, **kwargs):
+    """GET through the response cache and, on a miss, the rate limiter and pooled transport."""
+    return cached_get(url, source=source, headers=headers, fetch=lambda url, **kw: throttled_request(source, 'GET', url, **kw), **kwargs)
+
+
+def http_stream(url, source='default', headers=None, **kwargs):
+    """GET with a streamed body, for downloads too big for the response cache."""
+    cache = get_cache()
+    if cache is not None and cache.mode == 'offline':
+        raise OfflineCacheMiss(f"Offline mode: not downloading '{url}'")
+    return throttled_request(source, 'GET', url, headers=headers, stream=True, **kwargs)
+
+
+def http_post(url, source='default', **kwargs):
+    """POST through the rate limiter and pooled transport; POSTs are never cached."""
+    cache = get_cache()
+    if cache is not None and cache.mode == 'offline':
+        raise OfflineCacheMiss(f"Offline mode: not sending POST to '{url}'")
+    return throttled_request(source, 'POST', url, **kwargs)